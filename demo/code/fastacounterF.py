@@ -1,40 +1,139 @@
+import mmap
+import os
+
+import numpy as np
+
+_WHITESPACE = b' \t\r\n\x0b\x0c'
+_SOLID = np.ones(256, dtype=bool)  # байт не пробельный (входит в длину последовательности)
+_SOLID[list(_WHITESPACE)] = False
+_INDENT = b' \t\x0b\x0c'  # пробельные символы внутри строки (до '>' заголовка бывают отступы)
+_BLOCK_SIZE = 1 << 20  # fasta_counter читает файл блоками по 1 МБ
+
+
+def _at_line_start(data, gt):
+    #'>' на позиции gt начинает строку-заголовок: до него в строке только отступ
+    #(концом предыдущей строки считаются и \n, и \r)
+    i = gt
+    while i > 0 and data[i - 1] in _INDENT:
+        i -= 1
+    return i == 0 or data[i - 1] in b'\r\n'
+
+
+def _next_header(data, pos):
+    #позиция '>' следующей строки-заголовка в data начиная с pos или -1
+    gt = data.find(b'>', pos)
+    while gt >= 0:
+        if _at_line_start(data, gt):
+            return gt
+        gt = data.find(b'>', gt + 1)
+    return -1
+
+
+def _header_spans(block):
+    #начала ('>') и концы строк-заголовков блока, который начинается с начала строки - векторно по байтам
+    arr = np.frombuffer(block, dtype=np.uint8)
+    gts = np.flatnonzero(arr == ord('>'))
+    prev = arr[np.maximum(gts - 1, 0)]
+    is_header = (gts == 0) | (prev == 0x0A) | (prev == 0x0D)
+    #редкие '>' после пробела или табуляции: заголовок, если до него в строке только отступ
+    for i in np.flatnonzero(~is_header & np.isin(prev, list(_INDENT))):
+        is_header[i] = _at_line_start(block, int(gts[i]))
+    gts = gts[is_header]
+    newlines = np.flatnonzero((arr == 0x0A) | (arr == 0x0D))
+    ends = np.append(newlines, arr.size)[np.searchsorted(newlines, gts)]
+    return gts, ends
+
+
+def _first_break(data):
+    #позиция первого конца строки (\n или \r) в data или -1
+    breaks = [i for i in (data.find(b'\n'), data.find(b'\r')) if i >= 0]
+    return min(breaks) if breaks else -1
+
+
 class FastaAnalyzer:
     def __init__(self, fasta_file):
         self.fasta_file = fasta_file
     
     def fasta_sequence_generator(self):
-        current_header = None
-        current_sequence = []
-        
-        with open(self.fasta_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line:  # пропускаем пустые строки
-                    continue
-                    
-                if line.startswith('>'):
-                    if current_header is not None:
-                        full_sequence = ''.join(current_sequence)
-                        yield current_header, full_sequence
-                        current_sequence = []  # сбрасываем для новой последовательности
-                    
-                    current_header = line[1:]  # убираем '>'
-                else:
-                    current_sequence.append(line)
-            
-            #обрабатываем последнюю последовательность отдельно, потому что нет тригера >
-            if current_header is not None and current_sequence:
-                full_sequence = ''.join(current_sequence)
-                yield current_header, full_sequence
+        for header, sequence in self.raw_sequence_generator():
+            yield header.decode(), sequence.decode()
+    
+    def raw_sequence_generator(self):
+        #записи (заголовок, последовательность) в байтах: файл отображается в память (mmap), заголовки
+        #ищутся поиском '>' (memchr) прямо по отображению, без чтения строк; пробельные символы из
+        #последовательности удаляются
+        with open(self.fasta_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:  # mmap не умеет отображать пустой файл
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                gt = _next_header(mm, 0)  # текст до первого заголовка не учитываем
+                while gt >= 0:
+                    following = _next_header(mm, gt + 1)
+                    record_end = following if following >= 0 else len(mm)
+                    header_end = record_end
+                    for eol in (b'\n', b'\r'):
+                        found = mm.find(eol, gt, header_end)
+                        if found >= 0:
+                            header_end = found
+                    sequence = mm[header_end:record_end].translate(None, _WHITESPACE)
+                    #последнюю последовательность файла выдаём, только если в ней есть нуклеотиды
+                    if following >= 0 or sequence:
+                        yield mm[gt + 1:header_end].rstrip(), sequence
+                    gt = following
     
     def fasta_counter(self):
-        total_length = 0 
+        #файл читается блоками из целых строк: память - на один блок, а не на весь файл.
+        #нуклеотиды блока - непробельные байты без строк-заголовков; текст до первого заголовка не учитываем
+        total_length = 0
         sequence_count = 0  #n
+        last_length = 0  #нуклеотиды последней начатой последовательности
+        open_line = None  #вид строки, оборванной границей блока ('header' или 'seq'); саму строку не храним
+        tail = b''  #оборванная строка из одних отступов: её вид станет ясен в следующем блоке
+        with open(self.fasta_file, 'rb') as f:
+            while True:
+                chunk = f.read(_BLOCK_SIZE)
+                if not chunk:
+                    break
+                block = tail + chunk
+                tail = b''
+                if open_line is not None:
+                    #начало блока дописывает оборванную строку
+                    cut = _first_break(block)
+                    rest = block if cut < 0 else block[:cut]
+                    if open_line == 'seq' and sequence_count:
+                        solid = len(rest.translate(None, _WHITESPACE))
+                        total_length += solid
+                        last_length += solid
+                    if cut < 0:
+                        continue
+                    block = block[cut:]
+                    open_line = None
+                cut = max(block.rfind(b'\n'), block.rfind(b'\r')) + 1
+                if not block[cut:].strip(_INDENT):
+                    block, tail = block[:cut], block[cut:]
+                gts, ends = _header_spans(block)
+                if cut < len(block):
+                    open_line = 'header' if gts.size and ends[-1] == len(block) else 'seq'
+                start = 0
+                if not sequence_count:
+                    if not gts.size:
+                        continue
+                    start = int(gts[0])
+                sequence_count += int(gts.size)
+                #непробельные байты заголовков: строки-заголовки собираются в один массив
+                lengths = ends - gts
+                within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+                header_bytes = np.frombuffer(block, dtype=np.uint8)[np.repeat(gts, lengths) + within]
+                solid = len(block[start:].translate(None, _WHITESPACE))
+                total_length += solid - int(_SOLID[header_bytes].sum())
+                if gts.size:
+                    last_length = len(block[int(ends[-1]):].translate(None, _WHITESPACE))
+                else:
+                    last_length += solid
         
-        #исп генератор вместо прямого чтения
-        for header, sequence in self.fasta_sequence_generator():
-            total_length += len(sequence)
-            sequence_count += 1
+        #последняя последовательность учитывается, только если у неё есть нуклеотиды
+        if sequence_count > 0 and not last_length:
+            sequence_count -= 1
         
         #вычисляем среднюю длину если есть последовательности
         if sequence_count > 0:
@@ -1,20 +1,436 @@
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # графики только сохраняются в файлы: GUI-бэкенд не нужен
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PatchCollection
 import seaborn as sns
 import plotly.graph_objects as go
 from typing import Iterator, List, Dict
+from dataclasses import dataclass
 import gzip
+import io
+import mmap
 import os
-from collections import defaultdict
+import queue
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:  # numba не обязателен: без него работает построчный путь на NumPy
+    _NUMBA_AVAILABLE = False
+
+# Необязательные быстрые распаковщики gzip: isal (ускоренный zlib), rapidgzip (многопоточный)
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
+try:
+    import rapidgzip
+except ImportError:
+    rapidgzip = None
+
+PHRED_OFFSET = 33
+MAX_PHRED = 93  # '~' - последний печатный символ строки качества
+BASES = 'ACGTN'
+METRICS = frozenset({'count', 'length', 'qual', 'content'})  # что может собрать FastqAnalyzer.analyze
+
+# Таблица ASCII -> индекс нуклеотида в BASES (строчные буквы тоже). Остальные символы попадают
+# в дополнительный столбец len(BASES) гистограммы состава, который не входит в проценты, - так
+# классификация обходится одной индексацией без проверок
+OTHER_BASE = len(BASES)
+_BASE_LUT = np.full(256, OTHER_BASE, dtype=np.uint8)
+for _i, _base in enumerate(BASES):
+    _BASE_LUT[ord(_base)] = _BASE_LUT[ord(_base.lower())] = _i
+
+# Таблица ASCII -> Phred (+33) для декодирования строки качества одной операцией индексации
+_PHRED_LUT = (np.arange(256) - PHRED_OFFSET).astype(np.int8)
+
+# Компактное представление FASTR: байт = нуклеотид (2 бита, A/C/G/T) << 6 | Phred (6 бит, до 63).
+# Прочие символы (N и т.п.) кодируются нулевым байтом, как в FASTR; нулём же заполнен хвост строк.
+FASTR_MAX_PHRED = 0x3F
+
+# Размер блока чтения файла: разбор записей идёт по крупным блокам, а не построчными вызовами readline()
+READ_BUFFER_SIZE = 1 << 20
+
+
+def _grow_rows(arr: np.ndarray, n_rows: int) -> np.ndarray:
+    # Увеличивает число строк массива-гистограммы (удвоением), чтобы поместилось n_rows позиций
+    new_rows = max(n_rows, 2 * arr.shape[0])
+    grown = np.zeros((new_rows,) + arr.shape[1:], dtype=arr.dtype)
+    grown[:arr.shape[0]] = arr
+    return grown
+
+
+def hist_percentiles(hist: np.ndarray, percents) -> np.ndarray:
+    # Перцентили по гистограмме hist[позиция, значение] - то же, что np.percentile (линейная
+    # интерполяция) по исходным значениям, но без хранения и сортировки самих значений.
+    # Возвращает массив (len(percents), число позиций); для пустых позиций - 0.
+    cdf = np.cumsum(hist, axis=1)
+    total = cdf[:, -1]
+    result = np.zeros((len(percents), hist.shape[0]))
+    for k, p in enumerate(percents):
+        rank = p / 100 * np.maximum(total - 1, 0)
+        lo, hi = np.floor(rank), np.ceil(rank)
+        # значение с порядковым номером r - первое, у которого cdf > r
+        v_lo = (cdf > lo[:, None]).argmax(axis=1)
+        v_hi = (cdf > hi[:, None]).argmax(axis=1)
+        result[k] = np.where(total > 0, v_lo + (v_hi - v_lo) * (rank - lo), 0)
+    return result
+
+
+def _scan_chunk(buf, length_hist, qual_hist, content_hist, base_lut, do_qual, do_content):
+    # Разбирает подряд идущие целые записи FASTQ из буфера байтов buf (uint8) и дополняет гистограммы
+    # (качество и состав - только при do_qual / do_content).
+    # Возвращает (число записей, макс. длина качества, смещение первой необработанной записи,
+    # нужный размер гистограмм, если запись не поместилась (иначе 0), признак конца данных).
+    n = buf.size
+    pos = 0
+    count = 0
+    max_qual_len = 0
+    while True:
+        record_start = pos
+        # границы четырёх строк записи: [s, e) без \n и \r
+        s0 = pos
+        while pos < n and buf[pos] != 10:
+            pos += 1
+        if pos >= n:
+            return count, max_qual_len, record_start, 0, False
+        e0 = pos - 1 if pos > s0 and buf[pos - 1] == 13 else pos
+        if e0 == s0:  # пустая строка вместо заголовка - данные закончились
+            return count, max_qual_len, record_start, 0, True
+        pos += 1
+        s1 = pos
+        while pos < n and buf[pos] != 10:
+            pos += 1
+        if pos >= n:
+            return count, max_qual_len, record_start, 0, False
+        e1 = pos - 1 if pos > s1 and buf[pos - 1] == 13 else pos
+        pos += 1
+        while pos < n and buf[pos] != 10:  # плюс-строка
+            pos += 1
+        if pos >= n:
+            return count, max_qual_len, record_start, 0, False
+        pos += 1
+        s3 = pos
+        while pos < n and buf[pos] != 10:
+            pos += 1
+        if pos >= n:
+            return count, max_qual_len, record_start, 0, False
+        e3 = pos - 1 if pos > s3 and buf[pos - 1] == 13 else pos
+        pos += 1
+
+        seq_len = e1 - s1
+        qual_len = e3 - s3
+        if seq_len >= length_hist.shape[0] or seq_len > content_hist.shape[0] or qual_len > qual_hist.shape[0]:
+            return count, max_qual_len, record_start, max(seq_len + 1, qual_len), False
+        count += 1
+        length_hist[seq_len] += 1
+        if do_content:
+            for j in range(seq_len):
+                content_hist[j, base_lut[buf[s1 + j]]] += 1
+        if do_qual:
+            for j in range(qual_len):
+                q = min(max(int(buf[s3 + j]) - PHRED_OFFSET, 0), MAX_PHRED)
+                qual_hist[j, q] += 1
+        max_qual_len = max(max_qual_len, qual_len)
+
+
+if _NUMBA_AVAILABLE:
+    # без GIL: чтение в фоновом потоке идёт параллельно; без cache=True: модуль грузится под двумя именами
+    _scan_chunk = njit(nogil=True)(_scan_chunk)
+
+_warmed_up = False
+
+
+def _warmup():
+    # Компиляция ядра _scan_chunk на крошечной записи (один раз на процесс): время JIT тратится
+    # при создании анализатора, а не внутри первого прохода по файлу
+    global _warmed_up
+    if _NUMBA_AVAILABLE and not _warmed_up:
+        hists = _new_hists()
+        _scan_chunk(np.frombuffer(b'@r\nA\n+\nI\n\n', dtype=np.uint8), hists[0], hists[1], hists[2], _BASE_LUT,
+                    True, True)
+        _warmed_up = True
+
+
+def _new_hists() -> list:
+    # [длина] -> число прочтений, [позиция, phred], [позиция, нуклеотид или OTHER_BASE]
+    return [np.zeros(1024, dtype=np.int64),
+            np.zeros((256, MAX_PHRED + 1), dtype=np.int64),
+            np.zeros((256, len(BASES) + 1), dtype=np.int64)]
+
+
+def _grow_hists(hists: list, size: int):
+    # Расширяет все гистограммы так, чтобы поместилось прочтение длины size
+    hists[0] = _grow_rows(hists[0], size + 1)
+    hists[1] = _grow_rows(hists[1], size)
+    hists[2] = _grow_rows(hists[2], size)
+
+
+def _scan_buffer(buf: np.ndarray, hists: list, do_qual: bool = True, do_content: bool = True):
+    # Прогоняет все целые записи буфера через _scan_chunk, расширяя гистограммы по мере надобности.
+    # Возвращает (число записей, макс. длина качества, необработанный хвост буфера, признак конца данных)
+    count = 0
+    max_qual_len = 0
+    while True:
+        n, qual_len, consumed, need, stop = _scan_chunk(buf, hists[0], hists[1], hists[2], _BASE_LUT,
+                                                        do_qual, do_content)
+        count += n
+        max_qual_len = max(max_qual_len, qual_len)
+        buf = buf[consumed:]
+        if not need:
+            return count, max_qual_len, buf, stop
+        _grow_hists(hists, need)
+
+
+def _final_padding(tail: bytes) -> bytes:
+    # Недостающие переводы строк в конце данных: у последней записи могут отсутствовать строки,
+    # при чтении через read() они считаются пустыми
+    return (b'' if tail.endswith(b'\n') else b'\n') + b'\n\n\n'
+
+
+# Начало записи: строка '@...', затем последовательность и строка, начинающаяся с '+'
+# (строка качества тоже может начинаться с '@', но через строку после неё '+' не бывает)
+_RECORD_START_RE = re.compile(rb'\n@[^\n]*\n[^\n]*\n\+')
+
+
+def _chunk_ranges(filename: str, n_chunks: int) -> List[tuple]:
+    # Делит несжатый файл на n_chunks диапазонов байтов, каждый начинается с начала записи.
+    # Начало записи ищется регулярным выражением прямо по отображению файла в память (mmap).
+    size = os.path.getsize(filename)
+    if not size:
+        return []
+    bounds = [0]
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, n_chunks):
+            offset = max(size * i // n_chunks - 1, bounds[-1])
+            match = _RECORD_START_RE.search(mm, offset)
+            if match is None:
+                break
+            start = match.start() + 1
+            if start > bounds[-1]:
+                bounds.append(start)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def _advise_sequential(f, mm=None):
+    # Подсказка ядру: файл читается один раз подряд — агрессивное упреждающее чтение
+    # (где posix_fadvise/madvise недоступны, например на Windows, просто ничего не делаем)
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    if mm is not None and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+
+
+def _scan_mapped(filename: str, start: int, end: int, hists: list, do_qual: bool = True, do_content: bool = True):
+    # Разбирает диапазон [start, end) несжатого файла прямо из mmap (без копирования в память
+    # процесса); копируется только хвост последней записи. Возвращает (число записей, макс. длина качества)
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        _advise_sequential(f, mm)
+        count, max_qual_len, rest, stop = _scan_buffer(np.frombuffer(mm, dtype=np.uint8)[start:end], hists,
+                                                       do_qual, do_content)
+        tail = rest.tobytes()
+        del rest  # массив ссылается на mmap: освобождаем до закрытия отображения
+    if not stop:
+        n, qual_len, _, _ = _scan_buffer(np.frombuffer(tail + _final_padding(tail), dtype=np.uint8), hists,
+                                         do_qual, do_content)
+        count += n
+        max_qual_len = max(max_qual_len, qual_len)
+    return count, max_qual_len
+
+
+def _scan_range_worker(filename: str, start: int, end: int):
+    # Обработчик (поток или процесс): разбирает свой диапазон файла и возвращает свои гистограммы
+    hists = _new_hists()
+    if _NUMBA_AVAILABLE:
+        count, max_qual_len = _scan_mapped(filename, start, end, hists)
+    else:  # без numba - тот же векторный путь на NumPy, что и у analyze(), но только по своему диапазону
+        with open(filename, 'rb', buffering=READ_BUFFER_SIZE) as f:
+            f.seek(start)
+            count, max_qual_len = _scan_record_batches(
+                _iter_batches(lambda size: f.read(min(size, end - f.tell()))), hists)
+    return count, max_qual_len, hists
+
+
+def _open_gzip(filename: str):
+    # Бинарный поток распакованного .gz: isal, затем rapidgzip, иначе стандартный gzip.
+    # Поток оборачивается буфером READ_BUFFER_SIZE: у gzip свой буфер мал, и построчное
+    # чтение (iter_batches) иначе упирается в частые обращения к распаковщику.
+    if igzip is not None:
+        stream = igzip.open(filename, 'rb')
+    elif rapidgzip is not None:
+        stream = rapidgzip.open(filename, parallelization=os.cpu_count() or 1)
+    else:
+        stream = gzip.open(filename, 'rb')
+    return io.BufferedReader(stream, buffer_size=READ_BUFFER_SIZE)
+
+
+def _line_span(buf, start: int, end: int) -> tuple:
+    # Границы строки buf[start:end] без завершающего \r (CRLF), как в _scan_chunk: строки FASTQ
+    # не содержат других пробельных символов, поэтому полный strip не нужен
+    if end > start and buf[end - 1] == 13:
+        end -= 1
+    return start, end
+
+
+def _file_key(filename: str):
+    # (время изменения, размер) файла - ключ, по которому кэш статистики понимает, что файл изменился
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _sum_padded(arrays: list) -> np.ndarray:
+    # Сумма гистограмм разной длины (по первой оси)
+    total = np.zeros((max(a.shape[0] for a in arrays),) + arrays[0].shape[1:], dtype=arrays[0].dtype)
+    for a in arrays:
+        total[:a.shape[0]] += a
+    return total
+
 
 # 1. БАЗОВЫЕ КЛАССЫ
 
 class Record:
-    # Одна запись FASTQ: seq_id, sequence, quality
-    def __init__(self, seq_id: str, sequence: str, quality: str):
-        self.seq_id = seq_id
-        self.sequence = sequence
-        self.quality = quality
+    # Одна запись FASTQ - смещения полей в общем буфере блока (memoryview или mmap файла), без копирования байтов.
+    # raw_id, raw_sequence, raw_quality вырезают bytes при обращении, seq_id, sequence и quality
+    # ещё и декодируют в str. Буфер блока живёт, пока на него ссылается хотя бы одна запись;
+    # записи несжатого файла читают mmap и после FastqReader.close() бросают ValueError.
+    # Создаётся только для read() и BatchRecords.records(); анализатор работает с байтами напрямую
+    __slots__ = ('_buf', 'id_off', 'id_len', 'seq_off', 'seq_len', 'qual_off', 'qual_len')
+
+    def __init__(self, buf, id_off: int, id_len: int, seq_off: int, seq_len: int,
+                 qual_off: int, qual_len: int):
+        self._buf = buf
+        self.id_off, self.id_len = id_off, id_len
+        self.seq_off, self.seq_len = seq_off, seq_len
+        self.qual_off, self.qual_len = qual_off, qual_len
+
+    @classmethod
+    def from_fields(cls, seq_id: bytes, sequence: bytes, quality: bytes) -> 'Record':
+        # Запись из отдельных полей: они склеиваются в один собственный буфер
+        buf = memoryview(seq_id + sequence + quality)
+        return cls(buf, 0, len(seq_id), len(seq_id), len(sequence), len(seq_id) + len(sequence), len(quality))
+
+    @property
+    def raw_id(self) -> bytes:
+        return bytes(self._buf[self.id_off:self.id_off + self.id_len])
+
+    @property
+    def raw_sequence(self) -> bytes:
+        return bytes(self._buf[self.seq_off:self.seq_off + self.seq_len])
+
+    @property
+    def raw_quality(self) -> bytes:
+        return bytes(self._buf[self.qual_off:self.qual_off + self.qual_len])
+
+    @property
+    def seq_id(self) -> str:
+        return self.raw_id.decode()
+
+    @property
+    def sequence(self) -> str:
+        return self.raw_sequence.decode()
+
+    @property
+    def quality(self) -> str:
+        return self.raw_quality.decode()
+
+
+@dataclass
+class BatchRecords:
+    # Пачка записей FASTQ: заголовки (без '@'), последовательности и строки качества в байтах
+    ids: List[bytes]
+    seqs: List[bytes]
+    quals: List[bytes]
+
+    def __len__(self) -> int:
+        return len(self.seqs)
+
+    def records(self) -> Iterator[Record]:
+        # Те же записи в виде Record (str - по требованию через свойства Record)
+        for seq_id, sequence, quality in zip(self.ids, self.seqs, self.quals):
+            yield Record.from_fields(seq_id, sequence, quality)
+
+
+def _iter_batches(read, batch_size: int = 8192, chunk_size: int = 4 << 20) -> Iterator[BatchRecords]:
+    # Разбор пачками для FastqReader.iter_batches; read(size) - чтение следующего блока данных
+    # (файла целиком или только его диапазона)
+    lines = []
+    first = 0  # первая ещё не разобранная строка lines
+    tail = b''  # незаконченная строка в конце блока
+    eof = False
+    while True:
+        if not eof and len(lines) - first < 4 * batch_size:
+            chunk = read(chunk_size)
+            if chunk:
+                block = tail + chunk
+                if b'\r' in block:  # CRLF приводится к \n один раз на блок, а не построчно
+                    block = block.replace(b'\r\n', b'\n')
+                block = block.split(b'\n')
+                tail = block.pop()
+                lines = lines[first:] + block
+            else:
+                eof = True
+                if tail.endswith(b'\r'):
+                    tail = tail[:-1]
+                lines = lines[first:] + ([tail] if tail else [])
+                lines += [b''] * (-len(lines) % 4)  # у последней записи могут отсутствовать строки
+            first = 0
+            continue
+        n = min((len(lines) - first) // 4, batch_size)
+        batch = lines[first:first + 4 * n]
+        first += 4 * n
+        headers = batch[0::4]
+        stop = not all(headers)
+        if stop:  # пустая строка вместо заголовка - данные закончились
+            n = headers.index(b'')
+            del headers[n:]
+        if headers:
+            ids = [h[1:] if h.startswith(b'@') else h for h in headers]
+            yield BatchRecords(ids, batch[1:4 * n:4], batch[3:4 * n:4])
+        if stop or (eof and first == len(lines)):
+            break
+
+
+def _scan_record_batches(batches, hists: list, do_qual: bool = True, do_content: bool = True):
+    # Путь без numba: гистограммы каждой пачки записей BatchRecords - через np.bincount.
+    # Возвращает (число записей, макс. длина качества)
+    count = 0
+    max_qual_len = 0
+    for batch in batches:
+        seqs, quals = batch.seqs, batch.quals
+        count += len(seqs)
+        seq_lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+        qual_lengths = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+        longest = int(max(seq_lengths.max(), qual_lengths.max()))
+        if longest >= hists[0].shape[0] or longest > hists[1].shape[0]:
+            _grow_hists(hists, longest)
+        length_hist, qual_hist, content_hist = hists
+        length_hist[:longest + 1] += np.bincount(seq_lengths, minlength=longest + 1)
+        max_qual_len = max(max_qual_len, int(qual_lengths.max()))
+
+        # позиция каждого символа внутри своего прочтения для склеенных строк пачки
+        if do_qual:
+            qual_pos = np.arange(qual_lengths.sum()) - np.repeat(np.cumsum(qual_lengths) - qual_lengths, qual_lengths)
+            qualities = np.clip(FastqReader.quality_to_scores(b''.join(quals)), 0, MAX_PHRED)
+            width = MAX_PHRED + 1
+            qual_hist[:longest] += np.bincount(qual_pos * width + qualities,
+                                               minlength=longest * width).reshape(longest, width)
+
+        if do_content:
+            seq_pos = np.arange(seq_lengths.sum()) - np.repeat(np.cumsum(seq_lengths) - seq_lengths, seq_lengths)
+            idx = _BASE_LUT[np.frombuffer(b''.join(seqs), dtype=np.uint8)]
+            width = len(BASES) + 1
+            content_hist[:longest] += np.bincount(seq_pos * width + idx,
+                                                  minlength=longest * width).reshape(longest, width)
+    return count, max_qual_len
+
 
 # 2. КЛАСС ДЛЯ ЧТЕНИЯ FASTQ (+ генераторы)
 
@@ -22,39 +438,143 @@ class FastqReader:
     def __init__(self, filename: str):
         self.filename = filename
         self.file_handle = None
+        self._mm = None
         self._is_gzipped = filename.endswith('.gz')
 
     def __enter__(self):
         if self._is_gzipped:
-            self.file_handle = gzip.open(self.filename, 'rt')
+            self.file_handle = _open_gzip(self.filename)
         else:
-            self.file_handle = open(self.filename, 'r')
+            self.file_handle = open(self.filename, 'rb', buffering=READ_BUFFER_SIZE)
+            if os.fstat(self.file_handle.fileno()).st_size:  # пустой файл mmap отобразить не может
+                self._mm = mmap.mmap(self.file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+            _advise_sequential(self.file_handle, self._mm)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
     def read(self) -> Iterator[Record]:
+        # Записи Record, ссылающиеся на общий буфер (mmap или блок .gz): байты не копируются,
+        # вырезание и декодирование полей отложено до обращения к ним
+        for view, header, sequence, quality in self._record_spans():
+            id_off = header[0] + (view[header[0]] == 64)  # без '@'
+            yield Record(view, id_off, header[1] - id_off, sequence[0], sequence[1] - sequence[0],
+                         quality[0], quality[1] - quality[0])
+
+    def read_raw(self) -> Iterator[tuple]:
+        # Записи как (заголовок, последовательность, качество) без декодирования строк: для .gz - memoryview
+        # блока без копирования, для несжатого файла - bytes из mmap (срезы mmap не мешают close())
+        for view, header, sequence, quality in self._record_spans():
+            yield view[header[0]:header[1]], view[sequence[0]:sequence[1]], view[quality[0]:quality[1]]
+
+    def _record_spans(self) -> Iterator[tuple]:
+        # Записи как (memoryview буфера, границы заголовка, последовательности и качества).
+        # Несжатый файл просматривается целиком через mmap (срезы указывают прямо на страницы
+        # файла), .gz читается блоками READ_BUFFER_SIZE; хвост незаконченной записи переносится в новый
+        # блок, поэтому уже выданные срезы остаются действительными.
         if self.file_handle is None:
             raise RuntimeError("Use 'with FastqReader(...)'")
+        buf = self._mm if self._mm is not None else b''
+        view = buf if self._mm is not None else memoryview(buf)  # memoryview на mmap не дал бы закрыть его в close()
+        pos = 0
+        eof = self._mm is not None
         while True:
-            header = self.file_handle.readline().strip()
-            if not header:
+            ends = []
+            nl = pos - 1
+            while len(ends) < 4:
+                nl = buf.find(b'\n', nl + 1)
+                if nl < 0:
+                    break
+                ends.append(nl)
+            if len(ends) < 4 and not eof:
+                chunk = self.file_handle.read(READ_BUFFER_SIZE)
+                if chunk:
+                    buf = buf[pos:] + chunk
+                    view = memoryview(buf)
+                    pos = 0
+                else:
+                    eof = True
+                continue
+            # у последней записи могут отсутствовать строки - они считаются пустыми
+            ends += [len(buf)] * (4 - len(ends))
+            starts = [pos] + [min(end + 1, len(buf)) for end in ends[:3]]
+            header, sequence, _, quality = (_line_span(buf, s, e) for s, e in zip(starts, ends))
+            if header[0] == header[1]:  # пустая строка вместо заголовка - данные закончились
                 break
-            sequence = self.file_handle.readline().strip()
-            self.file_handle.readline()  # плюс-строка
-            quality = self.file_handle.readline().strip()
-            seq_id = header[1:] if header.startswith('@') else header
-            yield Record(seq_id, sequence, quality)
+            yield view, header, sequence, quality
+            pos = min(ends[3] + 1, len(buf))
+
+    def iter_batches(self, batch_size: int = 8192, chunk_size: int = 4 << 20) -> Iterator[BatchRecords]:
+        # Записи пачками BatchRecords: файл читается блоками chunk_size и режется на строки одним
+        # split, без построчного чтения; правила разбора те же, что у read()
+        if self.file_handle is None:
+            raise RuntimeError("Use 'with FastqReader(...)'")
+        yield from _iter_batches(self.file_handle.read, batch_size, chunk_size)
+
+    def chunks(self, chunk_size: int = 4 << 20) -> Iterator[bytes]:
+        # Сырые байты файла блоками по chunk_size (gzip распаковывается на лету)
+        with (_open_gzip(self.filename) if self._is_gzipped else open(self.filename, 'rb')) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def threaded_chunks(self, queue_len: int = 4, chunk_size: int = 4 << 20) -> Iterator[bytes]:
+        # То же, что chunks(), но чтение и распаковка идут в фоновом потоке: пока вызывающий
+        # разбирает текущий блок, следующие (до queue_len штук) уже готовятся
+        blocks = queue.Queue(maxsize=queue_len)
+        stop = threading.Event()
+
+        def produce():
+            chunks = self.chunks(chunk_size)
+            try:
+                for chunk in chunks:
+                    if stop.is_set():
+                        return
+                    blocks.put(chunk)
+                blocks.put(None)
+            except Exception as exc:  # ошибку чтения передаём потребителю
+                blocks.put(exc)
+            finally:
+                chunks.close()
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                chunk = blocks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            stop.set()
+            while producer.is_alive():  # освобождаем очередь, чтобы поток мог завершиться
+                try:
+                    blocks.get_nowait()
+                except queue.Empty:
+                    producer.join(0.01)
 
     def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
         if self.file_handle:
             self.file_handle.close()
             self.file_handle = None
 
     @staticmethod
-    def quality_to_scores(quality_str: str, phred_offset: int = 33) -> List[int]:
-        return [ord(char) - phred_offset for char in quality_str]
+    def quality_to_scores(quality_str, phred_offset: int = PHRED_OFFSET) -> np.ndarray:
+        # Строка качества (str или bytes) -> массив Phred
+        if isinstance(quality_str, str):
+            quality_str = quality_str.encode('ascii')
+        codes = np.frombuffer(quality_str, dtype=np.uint8)
+        if phred_offset == PHRED_OFFSET:
+            return _PHRED_LUT[codes]
+        return (codes.astype(np.int16) - phred_offset).astype(np.int8)
 
 # 3. АНАЛИЗАТОР FASTQ (статистика и графики)
 
@@ -62,119 +582,284 @@ class FastqAnalyzer:
     def __init__(self, filename: str, graphs_dir: str):
         self.reader = FastqReader(filename)
         self.graphs_dir = graphs_dir
+        self.refresh()  # собранных метрик и кэшей пока нет
+        self._fig = self._ax = None  # общая фигура для всех PNG-графиков
+        _warmup()
 
-    def get_sequence_count(self) -> int:
+    def analyze(self, metrics=METRICS):
+        # Явный единственный проход по файлу перед выводом статистики и графиков.
+        # metrics - подмножество METRICS: без 'qual' строки качества не декодируются,
+        # без 'content' не классифицируются нуклеотиды
+        self._scan(metrics)
+        return self
+
+    def _scan(self, metrics=METRICS):
+        # Один проход по файлу заполняет накопители нужных метрик; уже собранные повторно не читаются
+        metrics = frozenset(metrics)
+        if not metrics <= METRICS:
+            raise ValueError(f"Неизвестные метрики: {sorted(metrics - METRICS)}")
+        self._drop_stale()
+        if metrics <= self._metrics:
+            return
+        metrics |= self._metrics | {'count', 'length'}  # число и длины прочтений даёт любой проход
+        hists = _new_hists()
+        if _NUMBA_AVAILABLE:
+            count, max_qual_len = self._scan_chunks(hists, 'qual' in metrics, 'content' in metrics)
+        else:
+            count, max_qual_len = self._scan_batches(hists, 'qual' in metrics, 'content' in metrics)
+        self._store_hists(count, max_qual_len, hists, metrics)
+
+    def _store_hists(self, count: int, max_qual_len: int, hists: list, metrics=METRICS):
+        self._count = count
+        self._length_hist, self._qual_hist, self._content_hist = hists
+        self._qual_hist = self._qual_hist[:max_qual_len]
+        self._metrics = frozenset(metrics)
+        self._quality = self._content = self._percentiles = None  # производные результаты считаются заново
+        self._source_key = _file_key(self.reader.filename)
+
+    def refresh(self):
+        # Сбрасывает собранную статистику: следующий запрос заново прочитает файл
+        self._metrics = frozenset()
+        self._quality = self._content = self._percentiles = None
+        self._source_key = None
+
+    def _drop_stale(self):
+        # Если файл изменился после сбора статистики (другие время изменения или размер) - сбрасываем кэш
+        if self._metrics and _file_key(self.reader.filename) != self._source_key:
+            self.refresh()
+
+    def _scan_chunks(self, hists: list, do_qual: bool = True, do_content: bool = True):
+        # Блоки файла разбираются скомпилированным ядром _scan_chunk; хвост незаконченной записи
+        # переносится в следующий блок. Несжатый файл разбирается целиком через mmap, без блоков.
+        if not self.reader._is_gzipped and os.path.getsize(self.reader.filename):
+            return _scan_mapped(self.reader.filename, 0, os.path.getsize(self.reader.filename), hists,
+                                do_qual, do_content)
         count = 0
+        max_qual_len = 0
+        tail = b''
+        chunks = self.reader.threaded_chunks()
+        finished = False
+        while not finished:
+            chunk = next(chunks, None)
+            if chunk is None:
+                finished = True
+                if not tail:
+                    break
+                chunk = _final_padding(tail)
+            n, qual_len, buf, stop = _scan_buffer(np.frombuffer(tail + chunk, dtype=np.uint8), hists,
+                                                  do_qual, do_content)
+            count += n
+            max_qual_len = max(max_qual_len, qual_len)
+            if stop:
+                break
+            tail = buf.tobytes()
+        chunks.close()
+        return count, max_qual_len
+
+    def _scan_batches(self, hists: list, do_qual: bool = True, do_content: bool = True):
+        # Запасной путь без numba: пачки записей из iter_batches
         with self.reader:
-            for _ in self.reader.read():
-                count += 1
-        return count
+            return _scan_record_batches(self.reader.iter_batches(), hists, do_qual, do_content)
 
-    def get_average_sequence_length(self) -> float:
-        total_length = 0
-        count = 0
+    def analyze_parallel(self, n_workers: int = None, threads: bool = None):
+        # Параллельный разбор несжатого файла: диапазоны байтов по границам записей обрабатываются
+        # параллельно, гистограммы затем суммируются. Для .gz - обычный проход.
+        # threads: по умолчанию потоки, если есть numba (ядро _scan_chunk отпускает GIL, а гистограммы
+        # не нужно передавать между процессами), иначе отдельные процессы: без numba обработчики идут
+        # векторным путём по пачкам, а разрезание блоков на строки и склейка пачек держат GIL.
+        self._drop_stale()
+        if METRICS <= self._metrics:
+            return
+        if self.reader._is_gzipped:
+            self._scan()
+            return
+        n_workers = n_workers or os.cpu_count() or 1
+        ranges = _chunk_ranges(self.reader.filename, n_workers)
+        if not ranges:  # пустой файл
+            self._store_hists(0, 0, _new_hists())
+            return
+        if threads is None:
+            threads = _NUMBA_AVAILABLE
+        if len(ranges) == 1:  # один диапазон - разбираем сами, без пула
+            results = [_scan_range_worker(self.reader.filename, *ranges[0])]
+        else:
+            executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+            with executor(max_workers=min(n_workers, len(ranges))) as pool:
+                futures = [pool.submit(_scan_range_worker, self.reader.filename, start, end) for start, end in ranges]
+                results = [future.result() for future in futures]
+        count = sum(r[0] for r in results)
+        max_qual_len = max(r[1] for r in results)
+        hists = [_sum_padded([r[2][k] for r in results]) for k in range(3)]
+        self._store_hists(count, max_qual_len, hists)
+
+    def materialize_fastr(self, path: str):
+        # Один проход по FASTQ с записью компактной матрицы uint8 (прочтения x позиции) в .npy
+        # (np.memmap) и длин прочтений в path + '.lengths.npy'. Повторные расчёты можно вести
+        # по этой матрице через load_fastr, не разбирая текст FASTQ.
+        # Потери: Phred выше 63 обрезается, N и A с качеством 0 неразличимы.
+        self._scan()
+        max_len = max(int(np.flatnonzero(self._length_hist)[-1]) if self._count else 0, len(self._qual_hist))
+        matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(self._count, max_len))
+        lengths = np.zeros(self._count, dtype=np.int64)
+        row = 0
         with self.reader:
-            for record in self.reader.read():
-                total_length += len(record.sequence)
-                count += 1
-        return total_length / count if count > 0 else 0.0
+            for batch in self.reader.iter_batches():
+                seqs, quals = batch.seqs, batch.quals
+                # FASTR хранит одну длину на прочтение: берём общую часть последовательности и качества
+                n = np.minimum(np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs)),
+                               np.fromiter(map(len, quals), dtype=np.int64, count=len(quals)))
+                seq = np.frombuffer(b''.join(s[:k] for s, k in zip(seqs, n)), dtype=np.uint8)
+                qual = np.frombuffer(b''.join(q[:k] for q, k in zip(quals, n)), dtype=np.uint8)
+                base = _BASE_LUT[seq]
+                phred = np.clip(_PHRED_LUT[qual], 0, FASTR_MAX_PHRED).astype(np.uint8)
+                packed = np.where(base < 4, (base.astype(np.uint8) << 6) | phred, 0)
+                rows = np.repeat(np.arange(len(n)), n)
+                cols = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+                block = np.zeros((len(n), max_len), dtype=np.uint8)
+                block[rows, cols] = packed
+                matrix[row:row + len(n)] = block
+                lengths[row:row + len(n)] = n
+                row += len(n)
+        matrix.flush()
+        np.save(path + '.lengths.npy', lengths)
+        return matrix, lengths
+
+    def load_fastr(self, path: str, block_rows: int = 1 << 16):
+        # Заполняет накопители статистики из матрицы materialize_fastr (блоками строк memmap)
+        matrix = np.load(path, mmap_mode='r')
+        lengths = np.load(path + '.lengths.npy')
+        max_len = matrix.shape[1]
+        hists = _new_hists()
+        if max_len >= hists[0].shape[0] or max_len > hists[1].shape[0]:
+            _grow_hists(hists, max_len)
+        length_hist, qual_hist, content_hist = hists
+        length_hist[:max_len + 1] += np.bincount(lengths, minlength=max_len + 1)
+        positions = np.arange(max_len)
+        for start in range(0, len(lengths), block_rows):
+            block = np.asarray(matrix[start:start + block_rows])
+            inside = positions < lengths[start:start + block_rows, None]
+            pos = np.broadcast_to(positions, block.shape)[inside]
+            values = block[inside]
+            width = MAX_PHRED + 1
+            qual_hist[:max_len] += np.bincount(pos * width + (values & FASTR_MAX_PHRED),
+                                               minlength=max_len * width).reshape(max_len, width)
+            base = np.where(values == 0, BASES.index('N'), values >> 6)
+            width = len(BASES) + 1
+            content_hist[:max_len] += np.bincount(pos * width + base,
+                                                  minlength=max_len * width).reshape(max_len, width)
+        self._store_hists(len(lengths), max_len, hists)
+
+    def get_sequence_count(self) -> int:
+        self._scan({'count'})
+        return self._count
+
+    def get_average_sequence_length(self) -> float:
+        self._scan({'length'})
+        total_length = int(self._length_hist @ np.arange(self._length_hist.size))
+        return total_length / self._count if self._count > 0 else 0.0
 
     def get_sequence_length_distribution(self) -> Dict[int, int]:
-        length_dist = defaultdict(int)
-        with self.reader:
-            for record in self.reader.read():
-                length_dist[len(record.sequence)] += 1
-        return dict(length_dist)
+        self._scan({'length'})
+        lengths = np.flatnonzero(self._length_hist)
+        return {int(length): int(self._length_hist[length]) for length in lengths}
 
     def calculate_per_base_quality(self):
-        position_qualities = defaultdict(list)
-        with self.reader:
-            for record in self.reader.read():
-                qualities = FastqReader.quality_to_scores(record.quality)
-                for pos, qual in enumerate(qualities):
-                    position_qualities[pos].append(qual)
-        max_pos = max(position_qualities.keys()) if position_qualities else 0
-        mean_qualities, all_qualities = [], []
-        for pos in range(max_pos + 1):
-            quals = position_qualities[pos]
-            mean_qualities.append(np.mean(quals) if quals else 0)
-            all_qualities.append(quals)
-        return mean_qualities, all_qualities
+        # Средние по позициям и гистограмма качества hist[позиция, phred]
+        self._scan({'qual'})
+        if self._quality is None:
+            hist = self._qual_hist
+            totals = hist.sum(axis=1)
+            sums = hist @ np.arange(MAX_PHRED + 1)
+            mean_qualities = np.divide(sums, totals, out=np.zeros(len(hist)), where=totals > 0)
+            self._quality = mean_qualities, hist
+        return self._quality
+
+    def quality_percentiles(self) -> Dict[int, np.ndarray]:
+        # Перцентили качества по позициям {10, 25, 50, 75, 90} - считаются по гистограмме один раз
+        # и используются всеми графиками
+        _, hist = self.calculate_per_base_quality()
+        if self._percentiles is None:
+            percents = [10, 25, 50, 75, 90]
+            self._percentiles = dict(zip(percents, hist_percentiles(hist, percents)))
+        return self._percentiles
 
     def calculate_per_base_content(self) -> Dict[str, List[float]]:
-        position_counts = defaultdict(lambda: {'A': 0, 'C': 0, 'G': 0, 'T': 0, 'total': 0})
-        with self.reader:
-            for record in self.reader.read():
-                for pos, base in enumerate(record.sequence.upper()):
-                    if base in 'ACGTN':
-                        position_counts[pos][base] += 1
-                        position_counts[pos]['total'] += 1
-        max_pos = max(position_counts.keys()) if position_counts else 0
-        result = {'A': [], 'C': [], 'G': [], 'T': []}
-        for pos in range(max_pos + 1):
-            counts = position_counts[pos]
-            total = counts['total']
-            for base in ['A', 'C', 'G', 'T']:
-                result[base].append((counts[base] / total) * 100 if total > 0 else 0)
-        return result
+        self._scan({'content'})
+        if self._content is None:
+            counts = self._content_hist[:, :len(BASES)]  # прочие символы в проценты не входят
+            totals = counts.sum(axis=1)
+            used = np.flatnonzero(totals)
+            max_pos = used[-1] if used.size else 0
+            counts, totals = counts[:max_pos + 1], totals[:max_pos + 1]
+            percents = np.divide(counts * 100, totals[:, None], out=np.zeros(counts.shape), where=totals[:, None] > 0)
+            self._content = {base: percents[:, i].tolist() for i, base in enumerate('ACGT')}
+        return self._content
 
     # 4. ГРАФИКИ
 
+    def _axes(self, figsize=(14, 6)):
+        # Одна фигура на все графики анализатора: создаётся при первом вызове, затем только очищается
+        if self._fig is None:
+            self._fig, self._ax = plt.subplots(figsize=figsize)
+        else:
+            self._ax.cla()
+            self._fig.set_size_inches(figsize)
+        return self._fig, self._ax
+
+    def _save(self, filename: str) -> str:
+        self._fig.tight_layout()
+        output_path = os.path.join(self.graphs_dir, filename)
+        self._fig.savefig(output_path, dpi=150)
+        return output_path
+
+    def close(self):
+        # Освобождает общую фигуру графиков
+        if self._fig is not None:
+            plt.close(self._fig)
+            self._fig = self._ax = None
+
     def plot_per_base_quality_matplotlib(self):
         # Per Base Sequence Quality (matplotlib)
-        mean_qualities, all_qualities = self.calculate_per_base_quality()
-        if not mean_qualities:
+        mean_qualities, _ = self.calculate_per_base_quality()
+        if not len(mean_qualities):
             print("Нет данных для графика")
             return
-        positions = list(range(1, len(mean_qualities) + 1))
-        percentiles = []
-        for quals in all_qualities:
-            if quals:
-                percentiles.append({
-                    'q25': np.percentile(quals, 25),
-                    'median': np.median(quals),
-                    'q75': np.percentile(quals, 75),
-                    'q10': np.percentile(quals, 10),
-                    'q90': np.percentile(quals, 90),
-                    'mean': np.mean(quals)
-                })
-            else:
-                percentiles.append({k: 0 for k in ['q25', 'median', 'q75', 'q10', 'q90', 'mean']})
-        fig, ax = plt.subplots(figsize=(14, 6))
+        positions = np.arange(1, len(mean_qualities) + 1)
+        q10, q25, median, q75, q90 = self.quality_percentiles().values()
+        fig, ax = self._axes()
         ax.axhspan(28, 42, facecolor='green', alpha=0.1)
         ax.axhspan(20, 28, facecolor='orange', alpha=0.1)
         ax.axhspan(0, 20, facecolor='red', alpha=0.1)
         box_width = 0.8
-        for pos, perc in zip(positions, percentiles):
-            ax.add_patch(plt.Rectangle((pos - box_width/2, perc['q25']),
-                                      box_width, perc['q75'] - perc['q25'],
-                                      facecolor='yellow', edgecolor='black', linewidth=0.5))
-            ax.plot([pos - box_width/2, pos + box_width/2],
-                   [perc['median'], perc['median']], 'r-', linewidth=1)
-            ax.plot([pos, pos], [perc['q75'], perc['q90']], 'k-', linewidth=0.5)
-            ax.plot([pos, pos], [perc['q25'], perc['q10']], 'k-', linewidth=0.5)
-        ax.plot(positions, [p['mean'] for p in percentiles], 'b-', linewidth=1, label='Среднее')
+        # ящики, медианы и усы - по одной коллекции на все позиции вместо отдельного объекта на каждую
+        boxes = [plt.Rectangle((pos - box_width/2, low), box_width, high - low)
+                 for pos, low, high in zip(positions, q25, q75)]
+        ax.add_collection(PatchCollection(boxes, facecolor='yellow', edgecolor='black', linewidth=0.5))
+        medians = np.stack([np.column_stack([positions - box_width/2, median]),
+                            np.column_stack([positions + box_width/2, median])], axis=1)
+        ax.add_collection(LineCollection(medians, colors='red', linewidths=1))
+        whiskers = np.concatenate([np.stack([np.column_stack([positions, q75]), np.column_stack([positions, q90])], axis=1),
+                                   np.stack([np.column_stack([positions, q25]), np.column_stack([positions, q10])], axis=1)])
+        ax.add_collection(LineCollection(whiskers, colors='black', linewidths=0.5))
+        ax.plot(positions, mean_qualities, 'b-', linewidth=1, label='Среднее')
         ax.set_xlabel('Позиция в прочтении (bp)', fontsize=12)
         ax.set_ylabel('Phred качество', fontsize=12)
         ax.set_title('Per Base Sequence Quality', fontsize=14, fontweight='bold')
         ax.set_ylim(0, 42)
         ax.grid(True, alpha=0.3)
         ax.legend()
-        plt.tight_layout()
-        output_path = os.path.join(self.graphs_dir, 'per_base_quality_matplotlib.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
+        output_path = self._save('per_base_quality_matplotlib.png')
         print(f"График сохранен: {output_path}")
 
     def plot_per_base_quality_seaborn(self):
         # Per Base Sequence Quality (seaborn)
         mean_qualities, _ = self.calculate_per_base_quality()
-        if not mean_qualities:
+        if not len(mean_qualities):
             print("Нет данных для графика")
             return
         positions = list(range(1, len(mean_qualities) + 1))
         sns.set_style("whitegrid")
-        fig, ax = plt.subplots(figsize=(14, 6))
+        fig, ax = self._axes()
         ax.axhspan(28, 42, facecolor='green', alpha=0.1)
         ax.axhspan(20, 28, facecolor='orange', alpha=0.1)
         ax.axhspan(0, 20, facecolor='red', alpha=0.1)
@@ -184,30 +869,28 @@ class FastqAnalyzer:
         ax.set_title('Per Base Sequence Quality (Seaborn)', fontsize=14, fontweight='bold')
         ax.set_ylim(0, 42)
         ax.legend()
-        plt.tight_layout()
-        output_path = os.path.join(self.graphs_dir, 'per_base_quality_seaborn.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
+        output_path = self._save('per_base_quality_seaborn.png')
         print(f"График сохранен: {output_path}")
 
     def plot_per_base_quality_plotly(self):
         # Per Base Sequence Quality (Plotly interactive)
-        mean_qualities, all_qualities = self.calculate_per_base_quality()
-        if not mean_qualities:
+        mean_qualities, _ = self.calculate_per_base_quality()
+        if not len(mean_qualities):
             print("Нет данных для графика")
             return
         positions = list(range(1, len(mean_qualities) + 1))
-        medians = [np.median(q) if q else 0 for q in all_qualities]
-        q25 = [np.percentile(q, 25) if q else 0 for q in all_qualities]
-        q75 = [np.percentile(q, 75) if q else 0 for q in all_qualities]
+        mean_qualities = mean_qualities.tolist()
+        percentiles = self.quality_percentiles()
+        q25, medians, q75 = (percentiles[p].tolist() for p in (25, 50, 75))
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=positions, y=mean_qualities, mode='lines', name='Среднее',
-                                line=dict(color='blue', width=2)))
-        fig.add_trace(go.Scatter(x=positions, y=medians, mode='lines', name='Медиана',
-                                line=dict(color='red', width=2)))
-        fig.add_trace(go.Scatter(x=positions + positions[::-1], y=q75 + q25[::-1],
-                                fill='toself', fillcolor='rgba(255, 255, 0, 0.3)',
-                                line=dict(color='rgba(255,255,255,0)'), name='IQR (25-75%)'))
+        # WebGL-трассы: линии рисуются на GPU, а не тысячами SVG-узлов
+        fig.add_trace(go.Scattergl(x=positions, y=mean_qualities, mode='lines', name='Среднее',
+                                  line=dict(color='blue', width=2)))
+        fig.add_trace(go.Scattergl(x=positions, y=medians, mode='lines', name='Медиана',
+                                  line=dict(color='red', width=2)))
+        fig.add_trace(go.Scattergl(x=positions + positions[::-1], y=q75 + q25[::-1],
+                                  fill='toself', fillcolor='rgba(255, 255, 0, 0.3)',
+                                  line=dict(color='rgba(255,255,255,0)'), name='IQR (25-75%)'))
         fig.add_hrect(y0=28, y1=42, fillcolor="green", opacity=0.1, line_width=0)
         fig.add_hrect(y0=20, y1=28, fillcolor="orange", opacity=0.1, line_width=0)
         fig.add_hrect(y0=0, y1=20, fillcolor="red", opacity=0.1, line_width=0)
@@ -217,7 +900,7 @@ class FastqAnalyzer:
                          yaxis=dict(range=[0, 42]),
                          template='plotly_white', height=600)
         output_path = os.path.join(self.graphs_dir, 'per_base_quality_plotly.html')
-        fig.write_html(output_path)
+        fig.write_html(output_path, include_plotlyjs='cdn')  # plotly.js подгружается с CDN, а не встраивается (~3 МБ)
         print(f"Интерактивный график сохранен: {output_path}")
 
     def plot_per_base_content(self):
@@ -227,7 +910,7 @@ class FastqAnalyzer:
             print("Нет данных для графика")
             return
         positions = list(range(1, len(content['A']) + 1))
-        fig, ax = plt.subplots(figsize=(14, 6))
+        fig, ax = self._axes()
         ax.plot(positions, content['A'], label='% A', color='green', linewidth=1.5)
         ax.plot(positions, content['C'], label='% C', color='blue', linewidth=1.5)
         ax.plot(positions, content['G'], label='% G', color='black', linewidth=1.5)
@@ -238,10 +921,7 @@ class FastqAnalyzer:
         ax.set_ylim(0, 100)
         ax.legend()
         ax.grid(True, alpha=0.3)
-        plt.tight_layout()
-        output_path = os.path.join(self.graphs_dir, 'per_base_content.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
+        output_path = self._save('per_base_content.png')
         print(f"График сохранен: {output_path}")
 
     def plot_sequence_length_distribution(self):
@@ -252,16 +932,13 @@ class FastqAnalyzer:
             return
         lengths = sorted(length_dist.keys())
         counts = [length_dist[l] for l in lengths]
-        fig, ax = plt.subplots(figsize=(12, 6))
+        fig, ax = self._axes((12, 6))
         ax.bar(lengths, counts, color='steelblue', edgecolor='black', alpha=0.7)
         ax.set_xlabel('Длина последовательности (bp)', fontsize=12)
         ax.set_ylabel('Количество', fontsize=12)
         ax.set_title('Sequence Length Distribution', fontsize=14, fontweight='bold')
         ax.grid(True, alpha=0.3, axis='y')
-        plt.tight_layout()
-        output_path = os.path.join(self.graphs_dir, 'sequence_length_distribution.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
+        output_path = self._save('sequence_length_distribution.png')
         print(f"График сохранен: {output_path}")
 
 # 4. ЗАПУСК
@@ -278,6 +955,7 @@ if __name__ == "__main__":
         print(f"\nСоздана папка для графиков: {graphs_dir}")
     analyzer = FastqAnalyzer(FASTQ_FILE, graphs_dir)
     print(f"\nВычисление базовой статистики...")
+    analyzer.analyze()
     print(f"  Количество последовательностей: {analyzer.get_sequence_count()}")
     print(f"  Средняя длина последовательности: {analyzer.get_average_sequence_length():.2f} bp")
     print("\nГенерация графиков...")
@@ -286,5 +964,6 @@ if __name__ == "__main__":
     analyzer.plot_per_base_quality_plotly()
     analyzer.plot_per_base_content()
     analyzer.plot_sequence_length_distribution()
+    analyzer.close()
     print(f"\nАнализ завершен!\nВсе графики сохранены в папке: {graphs_dir}")
 
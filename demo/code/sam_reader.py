@@ -1,92 +1,440 @@
+import csv
+import mmap
+import os
+import re
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:  # numba не обязателен: без него длины CIGAR считает регулярное выражение
+    _NUMBA_AVAILABLE = False
+
+try:  # pyarrow не обязателен: без него таблицу выравниваний читает C-парсер pandas
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+# Операции CIGAR, которые сдвигают позицию на референсе
+_CIGAR_RE = re.compile(r'(\d+)([MDN=X])')
+
+
+@lru_cache(maxsize=None)
+def _cigar_ref_length(cigar):  # Длина участка референса, покрытого CIGAR (различных CIGAR мало - кэш без вытеснения)
+    return sum(int(n) for n, op in _CIGAR_RE.findall(cigar))
+
+
+# Таблица байт -> 1, если операция CIGAR сдвигает позицию на референсе (M D N = X), иначе 0
+_CONSUMES_REF = np.zeros(256, dtype=np.int64)
+_CONSUMES_REF[[ord(op) for op in "MDN=X"]] = 1
+
+
+def _cigar_ref_lengths(buf, starts, ends, out):  # Длины референса для всех CIGAR buf[starts[i]:ends[i]] одним циклом по байтам
+    for i in range(starts.size):
+        total = 0
+        num = 0
+        for k in range(starts[i], ends[i]):
+            c = buf[k]
+            d = c - 48
+            if 0 <= d <= 9:  # цифра
+                num = num * 10 + d
+            else:  # операция: длина добавляется через таблицу, без сравнения с каждой буквой
+                total += num * _CONSUMES_REF[c]
+                num = 0
+        out[i] = total
+    return out
+
+
+if _NUMBA_AVAILABLE:  # без cache=True: модуль грузится под двумя именами
+    _cigar_ref_lengths = njit(_cigar_ref_lengths)
+
+
+def _line_ranges(filename, n_chunks):  # Делим файл на n_chunks диапазонов байтов, каждый начинается с начала строки
+    size = os.path.getsize(filename)
+    if not size:
+        return []
+    bounds = [0]
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, n_chunks):
+            newline = mm.find(b"\n", max(size * i // n_chunks - 1, bounds[-1]))
+            if newline < 0:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def _add_position(chrom_stats, chrom, position):  # Обновляем [количество, мин, макс] хромосомы
+    stats = chrom_stats.get(chrom)
+    if stats is None:
+        chrom_stats[chrom] = [1, position, position]
+    else:
+        stats[0] += 1
+        if position < stats[1]:
+            stats[1] = position
+        if position > stats[2]:
+            stats[2] = position
+
+
+def _chrom_stats_worker(filename, start, end):  # Статистика по хромосомам для строк диапазона [start, end) файла
+    chrom_stats = {}
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        block = mm[start:end]
+    for line in block.split(b"\n"):
+        if line[:1] in b"@\r":  # заголовок или пустая строка (b"" тоже входит в b"@\r"); \r в конце строки не мешает - поля до POS
+            continue
+        fields = line.split(b"\t", 4)
+        _add_position(chrom_stats, fields[2].decode(), int(fields[3]))
+    return chrom_stats
+
+
 class SAMfile:
-    def parse_sam_file(self, filename):  # Читаем файл и разделяем на заголовки и выравнивания
-        headers = []
-        alignments = []
+    # Столбцы SAM, которые используются в анализе: номер столбца -> (имя, тип)
+    ALIGNMENT_COLUMNS = {0: ("qname", str), 2: ("rname", "category"), 3: ("pos", "int32"), 5: ("cigar", str)}
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._alignments_df = None
+        self._index = None  # строится явно через build_index()
+
+    @property
+    def alignments_df(self):  # Таблица выравниваний файла, читается один раз при первом обращении
+        if self._alignments_df is None:
+            if self.filename is None:
+                raise ValueError("Укажите файл: SAMfile(filename)")
+            df = self.read_alignments(self.filename)
+            df["end"] = self._alignment_ends(df)
+            self._alignments_df = df
+        return self._alignments_df
+
+    def build_index(self):  # Индекс по хромосомам: вызовите перед серией запросов к регионам, одиночный запрос дешевле фильтром
+        # хромосома -> (начала по возрастанию, концы в том же порядке, номера строк, макс. длина выравнивания)
+        df = self.alignments_df
+        index = {}
+        for chrom, rows in df.groupby("rname", observed=True, sort=False).indices.items():
+            starts = df["pos"].to_numpy(dtype=np.int64)[rows]
+            order = np.argsort(starts, kind="stable")
+            ends = df["end"].to_numpy(dtype=np.int64)[rows][order]
+            max_span = int((ends - starts[order]).max()) if rows.size else 0
+            index[chrom] = (starts[order], ends, rows[order], max_span)
+        self._index = index
+        return index
+
+    def _query_index(self, chromosome, start, end):  # Номера строк alignments_df, пересекающих регион
+        if self._index is None:
+            self.build_index()
+        if chromosome not in self._index:
+            return np.empty(0, dtype=np.intp)
+        starts, ends, rows, max_span = self._index[chromosome]
+        # Пересечь [start, end] могут только выравнивания, начавшиеся не раньше start - max_span
+        lo = np.searchsorted(starts, start - max_span, side="left")
+        hi = np.searchsorted(starts, end, side="right")
+        hits = rows[lo:hi][ends[lo:hi] >= start]
+        return np.sort(hits)  # сохраняем порядок строк файла
+
+    def iter_sam(self, filename):  # Потоково выдаём строки файла: ("H", заголовок) или ("A", выравнивание)
         with open(filename, "r") as f:
             for line in f:
-                line = line.strip()
+                line = line.rstrip("\n")  # текстовый режим уже привёл CRLF к \n, других пробелов по краям строк SAM нет
                 if line.startswith("@"):
-                    headers.append(line)
+                    yield "H", line
                 elif line:
-                    alignments.append(line)
+                    yield "A", line
+
+    @staticmethod
+    def _line_index(filename):  # Границы непустых строк файла векторными поисками по байтам: (буфер, начала, концы, маска заголовков)
+        with open(filename, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:  # пустой файл mmap отобразить не может
+                empty = np.empty(0, dtype=np.int64)
+                return b"", empty, empty, np.empty(0, dtype=bool)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        newlines = np.flatnonzero(buf == 0x0A)
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [buf.size]))
+        ends -= (ends > starts) & (buf[np.maximum(ends - 1, 0)] == 0x0D)  # CRLF
+        nonempty = ends > starts
+        starts, ends = starts[nonempty], ends[nonempty]
+        return mm, starts, ends, buf[starts] == ord("@")
+
+    @staticmethod
+    def _line_blocks(filename, block_size=1 << 20):  # Файл блоками по block_size байт: списки целых строк (bytes) без хранения всего файла
+        tail = b""  # незаконченная строка в конце блока переносится в следующий
+        with open(filename, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                lines = (tail + block).split(b"\n")
+                tail = lines.pop()
+                yield lines
+        if tail:
+            yield [tail]
+
+    def parse_sam_file(self, filename):  # Читаем файл и разделяем на заголовки и выравнивания (списки в памяти)
+        mm, starts, ends, is_header = self._line_index(filename)
+        try:
+            headers = [mm[s:e].decode() for s, e in zip(starts[is_header].tolist(), ends[is_header].tolist())]
+            alignments = [mm[s:e].decode() for s, e in zip(starts[~is_header].tolist(), ends[~is_header].tolist())]
+        finally:
+            if isinstance(mm, mmap.mmap):
+                mm.close()
         return headers, alignments
 
-    def get_header_groups(self, headers):  # Группируем заголовки по типам (@HD, @SQ, @RG, @PG)
+    def analyze(self, filename=None, region=None):  # Весь анализ за один проход по файлу, без списка выравниваний в памяти
+        # region = (хромосома, начало, конец) - если задан, заодно ищем выравнивания в регионе
+        if filename is None:
+            filename = self.filename
         groups = {}
+        chrom_stats = {}  # хромосома (bytes) -> [количество, мин позиция, макс позиция]
+        total = 0
+        names, chroms, positions, ends, cigars = [], [], [], [], []
+        region_chrom = region[0].encode() if region is not None else None
+        # строки разбираются в байтах прямо из блоков файла: в str декодируются только заголовки и найденные в регионе поля
+        for lines in self._line_blocks(filename):
+            for line in lines:
+                if line[-1:] == b"\r":  # CRLF
+                    line = line[:-1]
+                if not line:
+                    continue
+                if line.startswith(b"@"):
+                    line = line.decode()
+                    groups.setdefault(line.split("\t", 1)[0], []).append(line)
+                    continue
+                total += 1
+                fields = line.split(b"\t", 6)  # нужны поля до CIGAR включительно
+                chrom = fields[2]
+                position = int(fields[3])
+                _add_position(chrom_stats, chrom, position)
+                if chrom == region_chrom:
+                    cigar = fields[5].decode()
+                    align_end = self.calculate_alignment_end(position, cigar)
+                    if not (align_end < region[1] or position > region[2]):
+                        names.append(fields[0].decode())
+                        chroms.append(region[0])
+                        positions.append(position)
+                        ends.append(align_end)
+                        cigars.append(cigar)
+        return {
+            "headers": groups,
+            "count": total,
+            "chromosome_stats": self._stats_frame({chrom.decode(): stats for chrom, stats in chrom_stats.items()}),
+            "region": self._region_frame(names, chroms, positions, ends, cigars) if region is not None else None,
+        }
+
+    def get_header_groups(self, headers):  # Группируем заголовки по типам (@HD, @SQ, @RG, @PG)
+        groups = defaultdict(list)
         for header in headers:
-            header_type = header.split("\t")[0]
-            if header_type not in groups:
-                groups[header_type] = []
-            groups[header_type].append(header)
-        return groups
+            tab = header.find("\t")
+            groups[header if tab < 0 else header[:tab]].append(header)
+        return dict(groups)
 
     def print_headers(self, headers):  # Выводит информацию о заголовках
         groups = self.get_header_groups(headers)
-        print("Заголовки sam-файла:\n")
+        out = ["Заголовки sam-файла:\n"]  # собираем весь текст и выводим одной записью, а не print на строку
         for header_type, lines in groups.items():
-            print(f"{header_type} - найдено {len(lines)} записей:")
-            for line in lines:
-                print(f"  {line}")
-            print()
+            out.append(f"{header_type} - найдено {len(lines)} записей:")
+            out.extend(f"  {line}" for line in lines)
+            out.append("")
+        sys.stdout.write("\n".join(out) + "\n")
 
     def count_alignments(self, alignments):  # Считаем кол-во выравниваний
         return len(alignments)
 
-    def get_chromosome_stats(self, alignments):  # Делаем статистику по хромосомам
-        chromosomes = []
-        positions = {}
+    def get_chromosome_stats(self, alignments, as_frame=True):  # Делаем статистику по хромосомам
+        if not as_frame:
+            return self._chrom_stats_dict(alignments)
+        if isinstance(alignments, pd.DataFrame):  # таблица из alignments_df
+            df = pd.DataFrame({"chrom": alignments["rname"], "pos": alignments["pos"]})
+        else:
+            fields = [alignment.split("\t", 4) for alignment in alignments]  # нужны только RNAME и POS
+            df = pd.DataFrame({"chrom": pd.Categorical([f[2] for f in fields]),
+                               "pos": np.array([f[3] for f in fields], dtype=np.int64).astype(np.int32)})
+        return self._chromosome_stats(df)
+
+    @classmethod
+    def _chrom_stats_dict(cls, alignments):  # Та же статистика словарём хромосома -> (количество, мин, макс), порядок строк как у таблицы
+        if isinstance(alignments, pd.DataFrame):
+            stats = cls._chromosome_stats(pd.DataFrame({"chrom": alignments["rname"], "pos": alignments["pos"]}))
+            return {chrom: (int(count), int(low), int(high)) for chrom, count, low, high in stats.itertuples(index=False)}
+        chrom_stats = {}  # для списка строк pandas не нужен вовсе
         for alignment in alignments:
-            fields = alignment.split("\t")
-            chrom = fields[2]
-            pos = int(fields[3])
-            chromosomes.append(chrom)
-            if chrom not in positions:
-                positions[chrom] = {'min': pos, 'max': pos}
-            else:
-                positions[chrom]['min'] = min(positions[chrom]['min'], pos)
-                positions[chrom]['max'] = max(positions[chrom]['max'], pos)
-        df = pd.DataFrame({"Хромосома": chromosomes})
-        stats = df["Хромосома"].value_counts().reset_index()
-        stats.columns = ["Хромосома", "Количество"]
-        # Добавляем столбцы мин/макс позиций
-        stats["Мин_позиция"] = stats["Хромосома"].map(lambda c: positions[c]['min'])
-        stats["Макс_позиция"] = stats["Хромосома"].map(lambda c: positions[c]['max'])
-        return stats
+            fields = alignment.split("\t", 4)
+            _add_position(chrom_stats, fields[2], int(fields[3]))
+        ordered = sorted(chrom_stats.items(), key=lambda item: -item[1][0])  # сортировка устойчивая, как в таблице
+        return {chrom: tuple(stats) for chrom, stats in ordered}
+
+    @staticmethod
+    def _chromosome_stats(df):  # Количество, мин и макс позиции по хромосомам за один проход группировки
+        stats = df.groupby("chrom", sort=False, observed=True).agg(Количество=("pos", "size"),
+                                                                   Мин_позиция=("pos", "min"),
+                                                                   Макс_позиция=("pos", "max"))
+        stats = stats.sort_values("Количество", ascending=False, kind="stable")
+        stats = stats.rename_axis("Хромосома").reset_index()
+        return stats.astype({"Хромосома": str, "Количество": "int64", "Мин_позиция": "int64", "Макс_позиция": "int64"})
+
+    @staticmethod
+    def _stats_frame(chrom_stats):  # Таблица статистики из словаря хромосома -> [количество, мин, макс] (как у _chromosome_stats)
+        counts, mins, maxs = (list(column) for column in zip(*chrom_stats.values())) if chrom_stats else ([], [], [])
+        stats = pd.DataFrame({"Хромосома": list(chrom_stats), "Количество": counts,
+                              "Мин_позиция": mins, "Макс_позиция": maxs})
+        stats = stats.sort_values("Количество", ascending=False, kind="stable").reset_index(drop=True)
+        return stats.astype({"Хромосома": str, "Количество": "int64", "Мин_позиция": "int64", "Макс_позиция": "int64"})
+
+    @staticmethod
+    def read_headers(filename):  # Строки заголовка без чтения выравниваний (заголовок всегда идёт в начале файла)
+        headers = []
+        with open(filename, "rb") as f:
+            for line in f:
+                if not line.startswith(b"@"):
+                    break
+                headers.append(line.rstrip(b"\r\n").decode())
+        return headers
+
+    @staticmethod
+    def _count_header_lines(filename):  # Считаем строки заголовка (они всегда идут в начале файла)
+        count = 0
+        with open(filename, "rb") as f:
+            for line in f:
+                if not line.startswith(b"@"):
+                    break
+                count += 1
+        return count
+
+    @classmethod
+    def read_alignments(cls, filename, columns=None):  # Читаем нужные столбцы выравниваний одним вызовом read_csv (парсер на C)
+        if columns is None:
+            columns = cls.ALIGNMENT_COLUMNS
+        usecols = sorted(columns)
+        names = [columns[i][0] for i in usecols]
+        dtypes = {name: dtype for name, dtype in columns.values()}
+        if pa is not None and os.path.getsize(filename):  # пустой файл pyarrow не читает
+            return cls._read_alignments_arrow(filename, columns)
+        try:
+            return pd.read_csv(filename, sep="\t", header=None, skiprows=cls._count_header_lines(filename),
+                               usecols=usecols, names=names, dtype=dtypes,
+                               quoting=csv.QUOTE_NONE, engine="c")
+        except pd.errors.EmptyDataError:  # в файле только заголовки
+            return pd.DataFrame({name: pd.Series(dtype=dtypes[name]) for name in names})
+
+    @classmethod
+    def _read_alignments_arrow(cls, filename, columns):  # То же через многопоточный парсер pyarrow
+        # Число полей в строках SAM разное (необязательные теги), поэтому строка читается целиком
+        # одним столбцом и режется на поля векторно в pyarrow.compute
+        usecols = sorted(columns)
+        table = pa_csv.read_csv(
+            filename,
+            read_options=pa_csv.ReadOptions(skip_rows=cls._count_header_lines(filename), column_names=["line"]),
+            parse_options=pa_csv.ParseOptions(delimiter="\x1f", quote_char=False),  # разделитель, которого нет в SAM
+            convert_options=pa_csv.ConvertOptions(column_types={"line": pa.string()}))
+        fields = pc.split_pattern(table["line"], "\t", max_splits=usecols[-1] + 1)
+        data = {}
+        for i in usecols:
+            name, dtype = columns[i]
+            column = pc.list_element(fields, i)
+            if dtype == "category":  # словарное кодирование в Arrow превращается в pd.Categorical
+                column = pc.dictionary_encode(column)
+            elif dtype != str:
+                column = pc.cast(column, pa.type_for_alias(dtype))
+            data[name] = column
+        return pa.table(data).to_pandas()
+
+    @classmethod
+    def chromosome_stats_from_file(cls, filename):  # Та же статистика по хромосомам, но сразу из файла через pandas
+        df = cls.read_alignments(filename, {2: ("chrom", "category"), 3: ("pos", "int32")})
+        return cls._chromosome_stats(df)
+
+    @classmethod
+    def chromosome_stats_parallel(cls, filename, n_workers=None):  # Та же статистика, но диапазоны файла разбираются в отдельных процессах
+        n_workers = n_workers or os.cpu_count() or 1
+        ranges = _line_ranges(filename, n_workers)
+        if not ranges:  # пустой файл
+            return cls._stats_frame({})
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(ranges))) as pool:
+            futures = [pool.submit(_chrom_stats_worker, filename, start, end) for start, end in ranges]
+            parts = [future.result() for future in futures]
+        chrom_stats = {}  # диапазоны сливаются по порядку - хромосомы остаются в порядке первого появления
+        for part in parts:
+            for chrom, (count, low, high) in part.items():
+                stats = chrom_stats.get(chrom)
+                if stats is None:
+                    chrom_stats[chrom] = [count, low, high]
+                else:
+                    stats[0] += count
+                    stats[1] = min(stats[1], low)
+                    stats[2] = max(stats[2], high)
+        return cls._stats_frame(chrom_stats)
 
     def calculate_alignment_end(self, position, cigar):  # Вычисляет конечную позицию выравнивания из CIGAR строки
         if cigar == "*":
             return position
-        length = 0
-        current_number = ""
-        for char in cigar:
-            if char.isdigit():
-                current_number += char
-            else:
-                num = int(current_number)
-                if char in "MDN=X":
-                    length += num
-                current_number = ""
-        return position + length - 1
+        return position + _cigar_ref_length(cigar) - 1
+
+    @staticmethod
+    def _alignment_ends(df):  # Конечные позиции для всех выравниваний таблицы сразу
+        # Разбираем только уникальные CIGAR, а длины раздаём строкам по кодам factorize
+        codes, uniques = pd.factorize(df["cigar"])
+        if _NUMBA_AVAILABLE:  # все уникальные CIGAR одним буфером байтов через скомпилированное ядро
+            sizes = np.fromiter(map(len, uniques), dtype=np.int64, count=len(uniques))
+            ends = np.cumsum(sizes)
+            buf = np.frombuffer("".join(uniques).encode("ascii"), dtype=np.uint8)
+            lengths = _cigar_ref_lengths(buf, ends - sizes, ends, np.empty(len(uniques), dtype=np.int64))
+        else:
+            ops = pd.Series(uniques).str.extractall(_CIGAR_RE)
+            lengths = ops[0].astype(np.int64).groupby(level=0).sum()
+            lengths = lengths.reindex(range(len(uniques)), fill_value=0).to_numpy()
+        pos = df["pos"].to_numpy(dtype=np.int64)
+        ends = pos + lengths[codes] - 1
+        # CIGAR "*" - выравнивание без описания, конец совпадает с началом
+        return pd.Series(np.where(df["cigar"].to_numpy() == "*", pos, ends), index=df.index)
 
     def find_alignments_in_region(self, alignments, chromosome, start, end):  # Находим выравнивания в заданном геномном регионе
-        results = []
+        if isinstance(alignments, pd.DataFrame):  # таблица из alignments_df: фильтруем векторно, без цикла по строкам
+            if alignments is self._alignments_df and self._index is not None:
+                hits = alignments.iloc[self._query_index(chromosome, start, end)]
+            else:
+                # сначала дешёвые фильтры по хромосоме и началу, концы по CIGAR - только для оставшихся строк
+                hits = alignments[(alignments["rname"] == chromosome) & (alignments["pos"] <= end)]
+                if "end" not in hits:
+                    hits = hits.assign(end=self._alignment_ends(hits))
+                hits = hits[hits["end"] >= start]
+            return self._region_frame(hits["qname"].to_numpy(), hits["rname"].astype(str).to_numpy(),
+                                      hits["pos"].to_numpy(), hits["end"].to_numpy(), hits["cigar"].to_numpy())
+        names, chroms, positions, ends, cigars = [], [], [], [], []  # результаты по столбцам, а не словарями строк
+        needle = f"\t{chromosome}\t"
         for alignment in alignments:
-            fields = alignment.split("\t")
-            read_name = fields[0]
+            if needle not in alignment:  # быстрый поиск подстроки отсеивает чужие хромосомы без split
+                continue
+            fields = alignment.split("\t", 6)  # нужны поля до CIGAR включительно
             chrom = fields[2]
+            if chrom != chromosome:  # подстрока могла найтись в другом поле
+                continue
             position = int(fields[3])
             cigar = fields[5]
-            if chrom != chromosome:
-                continue
             align_end = self.calculate_alignment_end(position, cigar)
             if not (align_end < start or position > end):
-                results.append({
-                    "Название": read_name,
-                    "Хромосома": chrom,
-                    "Начало": position,
-                    "Конец": align_end,
-                    "CIGAR": cigar,
-                })
-        return pd.DataFrame(results)
+                names.append(fields[0])
+                chroms.append(chrom)
+                positions.append(position)
+                ends.append(align_end)
+                cigars.append(cigar)
+        return self._region_frame(names, chroms, positions, ends, cigars)
+
+    @staticmethod
+    def _region_frame(names, chroms, positions, ends, cigars):  # Таблица найденных выравниваний из готовых столбцов с явными типами
+        return pd.DataFrame({
+            "Название": pd.array(names, dtype=object),
+            "Хромосома": pd.Categorical(chroms),
+            "Начало": np.asarray(positions, dtype=np.int32),
+            "Конец": np.asarray(ends, dtype=np.int32),
+            "CIGAR": pd.array(cigars, dtype=object),
+        })
@@ -1,83 +1,542 @@
+import csv
+import gzip
+import mmap
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+import numpy as np
 import pandas as pd #для работы с данными в таблице
+try: #pyarrow не обязателен: без него варианты читает C-парсер pandas
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+try: #polars тоже не обязателен: с ним stats() без загруженной таблицы считается ленивым запросом polars
+    import polars as pl
+except ImportError:
+    pl = None
+
+#DP= в начале поля INFO или после ; (MQDP= и т.п. не подходят)
+_DP_PATTERN = r'(?:^|;)DP=(?P<dp>\d+)'
+
+#индекс для varregion: для каждой хромосомы отсортированные позиции вариантов и смещения их строк в файле;
+#хранится рядом с VCF и пересобирается, если файл изменился
+_INDEX_SUFFIX = '.pyidx'
+#индекс строится блоками по 4 МБ; при средней длине строки блока больше _LONG_LINE байт табуляции ищутся построчно
+_INDEX_BLOCK = 1 << 22
+_LONG_LINE = 256
+
+#обязательные столбцы VCF - если в файле нет строки #CHROM с именами
+_VCF_COLUMNS = ('CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO')
+
+
+def _line_ranges(path, begin, n_chunks): #делим файл после заголовка на n_chunks диапазонов байтов, каждый - с начала строки
+    size = os.path.getsize(path)
+    if size <= begin:
+        return []
+    bounds = [begin]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, n_chunks):
+            newline = mm.find(b'\n', max(begin + (size - begin) * i // n_chunks - 1, bounds[-1]))
+            if newline < 0:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def _count_worker(path, start, stop): #(переносы строк, пустые строки) в диапазоне [start, stop) файла
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return Vcf_reader._count_newlines(mm[i:min(i + (1 << 20), stop)] for i in range(start, stop, 1 << 20))[:2]
+
+
+def _varregion_worker(path, begin, stop, key, start, end): #варианты отрезка среди строк диапазона [begin, stop) файла
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return list(Vcf_reader._scan_region(mm, begin, stop, key, start, end))
+
+
 class Vcf_reader:
   # Получение заголовка и информации по отдельным группам заголовков
     def __init__(self, path:str):
         self.path = path
+        self._gzipped = path.endswith('.gz') #.vcf.gz (в т.ч. BGZF) читается потоком через gzip
+        self._stats_cache = {} #region_size -> результат stats()
+        self._source_key = None #(время изменения, размер) файла, по которому собраны кэши
 
-    def _lines(self): #служебный метод для вн функций
-        with open(self.path, 'rt', encoding='latin-1') as f:
-            for x in f:
-                yield x.strip()
+    _CACHED = ('_raw_headers', '_headers', '_header_groups', '_has_data', '_variants_df', '_region_index', '_column_names')
+
+    def _drop_stale(self): #если файл изменился (другие время изменения или размер) - сбрасываем все кэши
+        st = os.stat(self.path)
+        key = (st.st_mtime_ns, st.st_size)
+        if key != self._source_key:
+            for name in self._CACHED:
+                self.__dict__.pop(name, None)
+            self._stats_cache.clear()
+            self._source_key = key
+
+    def _open(self): #файл в двоичном режиме: строки декодируются только в том, что возвращается наружу
+        return gzip.open(self.path, 'rb') if self._gzipped else open(self.path, 'rb')
+
+    def _lines(self): #служебный метод для вн функций, отдаёт сырые строки bytes без strip
+        with self._open() as f:
+            yield from f
+
+    def _data_start(self): #файл, перемотанный за заголовок
+        f = self._open()
+        f.seek(sum(map(len, self._raw_headers)))
+        return f
+
+    @cached_property
+    def _has_data(self): #есть ли что-то после заголовка
+        with self._data_start() as f:
+            return bool(f.read(1))
+
+    @cached_property
+    def _raw_headers(self): #сырые строки заголовка (#...), читаются один раз - заголовок всегда в начале файла
+        headers = []
+        for x in self._lines():
+            if not x.startswith(b'#'):
+                break
+            headers.append(x)
+        return headers
+
+    @cached_property
+    def _headers(self): #строки заголовка без переноса строки
+        return [x.rstrip(b'\r\n').decode('latin-1') for x in self._raw_headers]
+
+    _GROUPS = ('##', '##INFO', '##FILTER', '##FORMAT', '##ALT', '##contig') #префиксы групп заголовка
+
+    @cached_property
+    def _header_groups(self): #строки заголовка по всем группам сразу - один проход по кэшу вместо прохода на каждую группу
+        groups = {prefix: [] for prefix in self._GROUPS}
+        for x in self._headers:
+            if not x.startswith('##'):
+                continue
+            for prefix in self._GROUPS:
+                if x.startswith(prefix):
+                    groups[prefix].append(x)
+        return groups
+
+    def _header_group(self, prefix): #строки заголовка с нужным префиксом из кэша
+        self._drop_stale()
+        return iter(self._header_groups[prefix])
 
     def title(self):
-        return (x for x in self._lines() if x.startswith('##'))
+        return self._header_group('##')
             
     def info(self):
-        return (x for x in self._lines() if x.startswith('##INFO'))
+        return self._header_group('##INFO')
             
     def filter(self):
-        return (x for x in self._lines() if x.startswith('##FILTER'))
+        return self._header_group('##FILTER')
             
     def format(self):  #oпределяет, какие параметры могут быть указаны для каждого образца
-        return (x for x in self._lines() if x.startswith('##FORMAT'))
+        return self._header_group('##FORMAT')
     
     def alt(self): #описание альтернативных типов аллелей
-        return (x for x in self._lines() if x.startswith('##ALT'))
+        return self._header_group('##ALT')
             
     def contig(self): #информация о хромосомах
-        return (x for x in self._lines() if x.startswith('##contig'))
+        return self._header_group('##contig')
+
+    @cached_property
+    def _variants_df(self): #CHROM, POS, INFO всех вариантов одной таблицей (парсер read_csv на C)
+        if pa is not None and self._has_data: #pyarrow не читает файл без данных
+            return self._read_variants_arrow()
+        df = self._read_variants_pandas()
+        #глубина из INFO считается один раз при загрузке, векторно по всему столбцу
+        df['dp'] = df['info'].str.extract(_DP_PATTERN, expand=False).fillna('0').astype('int64')
+        return df
+
+    def _read_variants_pandas(self):
+        #число столбцов read_csv берёт из первой строки: если она короче 8 полей, INFO пропал бы во всех строках,
+        #поэтому ширина задаётся явно - не меньше строки #CHROM и первой строки вариантов
+        names = [str(i) for i in range(max(len(self._column_names), self._first_row_width()))]
+        names[:2], names[7] = ['chrom', 'pos'], 'info'
+        try:
+            df = pd.read_csv(self.path, sep='\t', header=None, skiprows=len(self._headers),
+                             usecols=['chrom', 'pos', 'info'], names=names,
+                             dtype={'chrom': 'category', 'pos': 'int64', 'info': str}, #хромосом мало - категория
+                             quoting=csv.QUOTE_NONE, engine='c')
+        except pd.errors.EmptyDataError: #в файле нет вариантов
+            df = pd.DataFrame({'chrom': pd.Series(dtype='category'), 'pos': pd.Series(dtype='int64'),
+                               'info': pd.Series(dtype=str)})
+        return df
+
+    def _first_row_width(self): #число полей первой непустой строки вариантов
+        with self._data_start() as f:
+            for x in f:
+                x = x.rstrip(b'\r\n')
+                if x:
+                    return x.count(b'\t') + 1
+        return 0
+
+    def _read_variants_arrow(self): #то же через многопоточный парсер pyarrow
+        #строка читается целиком одним столбцом и режется на поля векторно в pyarrow.compute;
+        #к строке дописываются 7 табуляций, чтобы и в короткой строке были все 8 полей
+        table = pa_csv.read_csv(
+            self.path,
+            read_options=pa_csv.ReadOptions(skip_rows=len(self._raw_headers), column_names=['line']),
+            parse_options=pa_csv.ParseOptions(delimiter='\x1f', quote_char=False), #разделитель, которого нет в VCF
+            convert_options=pa_csv.ConvertOptions(column_types={'line': pa.string()}))
+        line = table['line']
+        fields = pc.split_pattern(pc.binary_join_element_wise(line, '\t' * 7, ''), '\t', max_splits=8)
+        info = pc.if_else(pc.greater_equal(pc.count_substring(line, '\t'), 7), pc.list_element(fields, 7), None)
+        #глубина извлекается ядром регулярных выражений Arrow, без перехода к объектам Python
+        dp = pc.struct_field(pc.extract_regex(info, _DP_PATTERN), 'dp')
+        return pa.table({'chrom': pc.dictionary_encode(pc.list_element(fields, 0)), #словарный столбец - pd.Categorical
+                         'pos': pc.cast(pc.list_element(fields, 1), pa.int64()),
+                         'info': info,
+                         'dp': pc.fill_null(pc.cast(dp, pa.int64()), 0)}).to_pandas()
 
     # Получение количества вариантов.   
     def count(self):
-        count = 0
-        for x in self._lines():
-            if not x.startswith('#'):
-                count += 1
-        return count
+        self._drop_stale()
+        if '_variants_df' in self.__dict__: #таблица уже загружена - считать заново не нужно
+            return len(self._variants_df)
+        #иначе считаем переносы строк блоками по 1 МБ после заголовка
+        with self._data_start() as f:
+            lines, blank, last = self._count_newlines(iter(lambda: f.read(1 << 20), b''))
+        if last != b'\n': #последняя строка без переноса
+            lines += 1
+        return lines - blank
+
+    def count_parallel(self, n_workers=None): #то же, но диапазоны несжатого файла считаются в отдельных процессах
+        self._drop_stale()
+        if self._gzipped:
+            return self.count()
+        n_workers = n_workers or os.cpu_count() or 1
+        ranges = _line_ranges(self.path, sum(map(len, self._raw_headers)), n_workers)
+        if not ranges: #нет данных после заголовка
+            return 0
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(ranges))) as pool:
+            futures = [pool.submit(_count_worker, self.path, start, stop) for start, stop in ranges]
+            parts = [future.result() for future in futures]
+        lines = sum(part[0] for part in parts) - sum(part[1] for part in parts)
+        with open(self.path, 'rb') as f: #диапазоны начинаются с начала строки, поэтому их можно просто сложить
+            f.seek(ranges[-1][1] - 1)
+            if f.read(1) != b'\n': #последняя строка без переноса
+                lines += 1
+        return lines
+
+    @staticmethod
+    def _count_newlines(chunks): #(переносы строк, пустые строки, последний байт) по блокам, начинающимся с начала строки
+        #переносы считаются векторно, без цикла по строкам; пустые строки (перенос сразу после переноса),
+        #как и read_csv, потом вычитаются
+        lines = blank = 0
+        last = b'\n'
+        for chunk in chunks:
+            nl = np.frombuffer(last + chunk, dtype=np.uint8) == 10
+            lines += int(np.count_nonzero(nl[1:]))
+            blank += int(np.count_nonzero(nl[1:] & nl[:-1]))
+            last = chunk[-1:]
+        return lines, blank, last
+
+    # Весь анализ за один разбор файла: число вариантов и статистика берутся из одной таблицы вариантов,
+    # а не из отдельных проходов count() и stats(); region = (хромосома, начало, конец) - если задан, заодно ищем варианты в отрезке
+    def analyze(self, region_size=1000, region=None):
+        self._drop_stale()
+        return {
+            'headers': {prefix: list(lines) for prefix, lines in self._header_groups.items()},
+            'count': len(self._variants_df),
+            'stats': self.stats(region_size),
+            'region': self.varregion(*region) if region is not None else None,
+        }
 
     # Получение статистики “количество выравниваний - регион.” (Используйте pandas)
     def stats(self, region_size=1000):
-        result = {}
-        def varlines(): # читает только строки с вариантами без заголовков
-            for x in self._lines():
-                if not x.startswith('#'):
-                    yield x
-
-        for y in varlines(): #проходим по каждой строке
-            columns = y.split('\t') #разделяем по столбцам
-            if len(columns) < 8: 
-                continue
-            chrom = columns[0]
-            pos = int(columns[1])
-            info = columns[7]
-            dp = 0
-            for x in info.split(';'): #перебор строки и разделение по ;
-                if x.startswith('DP='):
-                    dp = int(x[3:])
-                    break
-
-            region_start = (pos // region_size) * region_size #опр начало региона
-            key = (chrom, region_start)
-            if key not in result:
-                result[key] = {'TOTAL_DEPTH': 0, 'VARIANT_COUNT': 0}
-            result[key]['TOTAL_DEPTH'] += dp
-            result[key]['VARIANT_COUNT'] += 1
-
-        #преобразуем словарь в таблицу
-        data = ([k[0], k[1], v['TOTAL_DEPTH'], v['VARIANT_COUNT']] for k, v in result.items())
-        return pd.DataFrame(data, columns=['CHROM','REGION','TOTAL_DEPTH','VARIANT_COUNT'])
+        self._drop_stale()
+        if region_size not in self._stats_cache: #повторный вызов с тем же размером региона файл не разбирает
+            self._stats_cache[region_size] = self._compute_stats(region_size)
+        return self._stats_cache[region_size].copy() #копия: изменения у вызывающего не портят кэш
+
+    def _compute_stats(self, region_size):
+        if pl is not None and not self._gzipped and '_variants_df' not in self.__dict__ and self._has_data:
+            return self._stats_polars(region_size)
+        d = self._variants_df
+        d = d[d['info'].notna()] #строки, где меньше 8 столбцов, пропускаем
+        region = (d['pos'] // region_size) * region_size #опр начало региона
+        result = (pd.DataFrame({'CHROM': d['chrom'], 'REGION': region, 'DP': d['dp']})
+                  .groupby(['CHROM', 'REGION'], sort=False, observed=True)['DP']
+                  .agg(TOTAL_DEPTH='sum', VARIANT_COUNT='size')).reset_index()
+        result['CHROM'] = result['CHROM'].astype(str) #в результате хромосома - обычная строка, как раньше
+        return result
+
+    def _stats_polars(self, region_size): #то же одним ленивым запросом polars: чтение, DP, регион и группировка
+        #выполняются многопоточно в одном плане; строка читается целиком и режется на поля, как в pyarrow
+        fields = pl.col('line').str.splitn('\t', 9)
+        result = (pl.scan_csv(self.path, has_header=False, separator='\x1f', quote_char=None,
+                              skip_rows=len(self._raw_headers), new_columns=['line'], schema={'line': pl.String})
+                  .filter(pl.col('line').is_not_null() & (pl.col('line') != '')) #пустые строки, как read_csv, пропускаем
+                  .select(fields.struct.field('field_0').alias('CHROM'),
+                          fields.struct.field('field_1').cast(pl.Int64).alias('POS'),
+                          fields.struct.field('field_7').alias('INFO'))
+                  .filter(pl.col('INFO').is_not_null()) #строки, где меньше 8 столбцов, пропускаем
+                  .group_by('CHROM', (pl.col('POS') // region_size * region_size).alias('REGION'), maintain_order=True)
+                  .agg(pl.col('INFO').str.extract(_DP_PATTERN, 1).cast(pl.Int64).fill_null(0).sum().alias('TOTAL_DEPTH'),
+                       pl.len().cast(pl.Int64).alias('VARIANT_COUNT'))
+                  .collect())
+        result = pd.DataFrame(result.to_dict(as_series=False)) #без pyarrow, который нужен polars.to_pandas()
+        return result.astype({'CHROM': str, 'REGION': 'int64', 'TOTAL_DEPTH': 'int64', 'VARIANT_COUNT': 'int64'})
 
     # Получение вариантов, лежащем в определенном геномном отрезке (аналог bedtools intersect).
     def varregion(self, chrom, start, end):
-        def gen(): #нужен чтобы вернуть не генератор
-            for x in self._lines(): 
-                if x.startswith('#'):
-                    continue # пропускаем заголовки
-                columns = x.strip().split('\t')  #убирает пробелы и символы переноса строки в начале и конце + разделяет строку на столбцы 
-                if len(columns) < 2:  # пропуск пустых или битых строк
-                    continue
-                x_chrom = columns[0] 
-                x_pos = int(columns[1])  #позицию переводим в число
-                if x_chrom == chrom and start <= x_pos <= end: 
-                    yield columns
-        return list(gen())
+        return list(self.varregion_iter(chrom, start, end))
+
+    def varregion_df(self, chrom, start, end): #то же таблицей pandas: POS - int64, QUAL - float (. -> NaN)
+        names = self._column_names
+        columns = [[] for _ in names] #строки сразу раскладываются по столбцам
+        for row in self.varregion_iter(chrom, start, end):
+            row = row[:len(names)]
+            for column, value in zip(columns, row):
+                column.append(value)
+            for column in columns[len(row):]: #короткая строка - недостающие поля пустые
+                column.append(None)
+        df = pd.DataFrame({name: pd.Series(column, dtype=str) for name, column in zip(names, columns)})
+        df['POS'] = df['POS'].astype('int64')
+        df['QUAL'] = pd.to_numeric(df['QUAL'], errors='coerce').astype('float64')
+        return df
+
+    @cached_property
+    def _column_names(self): #имена столбцов из строки #CHROM (с образцами), иначе - обязательные столбцы VCF
+        if self._headers and self._headers[-1].startswith('#CHROM\t'):
+            names = self._headers[-1][1:].split('\t')
+            if len(names) >= len(_VCF_COLUMNS):
+                return names
+        return list(_VCF_COLUMNS)
+
+    def varregion_iter(self, chrom, start, end): #то же, но строки отдаются по одной, без списка в памяти
+        self._drop_stale()
+        try:
+            key = chrom.encode('latin-1') + b'\t'
+        except UnicodeEncodeError: #такой хромосомы в файле быть не может
+            return
+        if key.startswith(b'#'): #строки на # - заголовки
+            return
+        if self._gzipped: #в сжатом файле по смещениям не перейти - просматриваем его потоком
+            with self._data_start() as f:
+                for x in f:
+                    if x.startswith(key):
+                        x_pos = self._pos_field(x, len(key) - 1)
+                        if x_pos is not None and start <= x_pos <= end:
+                            yield x.strip().decode('latin-1').split('\t')
+            return
+        if not os.path.getsize(self.path): #пустой файл mmap не отображает
+            return
+        index = self._region_index
+        if index is not None: #двоичный поиск отрезка по позициям хромосомы и чтение только его строк
+            if chrom not in index:
+                return
+            positions, offsets = index[chrom]
+            lo = np.searchsorted(positions, start, 'left')
+            hi = np.searchsorted(positions, end, 'right')
+            if lo >= hi:
+                return
+            with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in np.sort(offsets[lo:hi]).tolist(): #в порядке строк файла
+                    line_end = mm.find(b'\n', offset)
+                    x = mm[offset:] if line_end < 0 else mm[offset:line_end]
+                    yield x.strip().decode('latin-1').split('\t')  #убирает пробелы и символы переноса строки в начале и конце + разделяет строку на столбцы
+            return
+        #индекс неприменим (битые строки) - просматриваем файл целиком
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from self._scan_region(mm, sum(map(len, self._raw_headers)), len(mm), key, start, end)
+
+    def varregion_parallel(self, chrom, start, end, n_workers=None): #то же без индекса: диапазоны файла просматриваются в отдельных процессах
+        self._drop_stale()
+        try:
+            key = chrom.encode('latin-1') + b'\t'
+        except UnicodeEncodeError: #такой хромосомы в файле быть не может
+            return []
+        if self._gzipped or key.startswith(b'#'):
+            return self.varregion(chrom, start, end)
+        n_workers = n_workers or os.cpu_count() or 1
+        ranges = _line_ranges(self.path, sum(map(len, self._raw_headers)), n_workers)
+        if not ranges:
+            return []
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(ranges))) as pool:
+            futures = [pool.submit(_varregion_worker, self.path, begin, stop, key, start, end) for begin, stop in ranges]
+            return [row for future in futures for row in future.result()] #диапазоны по порядку - строки в порядке файла
+
+    @classmethod
+    def _scan_region(cls, mm, begin, stop, key, start, end): #варианты отрезка среди строк, начинающихся в [begin, stop)
+        for x in cls._chrom_lines(mm, begin, stop, key):
+            x_pos = cls._pos_field(x, len(key) - 1)
+            if x_pos is None:  # пропуск битых строк
+                continue
+            if start <= x_pos <= end: #всю строку режем на столбцы только если она попала в отрезок
+                yield x.strip().decode('latin-1').split('\t')  #убирает пробелы и символы переноса строки в начале и конце + разделяет строку на столбцы
+
+    @staticmethod
+    def _chrom_lines(mm, begin, stop, key): #строки, начинающиеся в [begin, stop) с key (CHROM + табуляция)
+        #поиск идёт сразу по '\n' + key через mm.find (на C), строки других хромосом даже не вырезаются
+        needle = b'\n' + key
+        line_start = begin
+        if mm[begin:begin + len(key)] != key:
+            line_start = mm.find(needle, begin, stop + len(key)) + 1
+            if not line_start: #find вернул -1
+                return
+        while line_start < stop:
+            line_end = mm.find(b'\n', line_start)
+            if line_end < 0:
+                line_end = len(mm)
+            yield mm[line_start:line_end]
+            line_start = mm.find(needle, line_end, stop + len(key)) + 1
+            if not line_start:
+                return
+
+    @staticmethod
+    def _pos_field(x, tab): #POS (второй столбец) строки x, tab - индекс первой табуляции; None - битая строка
+        next_tab = x.find(b'\t', tab + 1)
+        field = x[tab + 1:] if next_tab < 0 else x[tab + 1:next_tab]
+        if next_tab < 0 and not field.strip():
+            return None
+        return int(field)  #позицию переводим в число
+
+    @staticmethod
+    def _data_lines(mm, begin): #(смещение, строка) для всех строк вариантов с позиции begin; пустые и # пропускаются
+        line_start = begin
+        while line_start < len(mm):
+            line_end = mm.find(b'\n', line_start)
+            if line_end < 0:
+                line_end = len(mm)
+            x = mm[line_start:line_end]
+            if x.strip() and not x.startswith(b'#'):
+                yield line_start, x
+            line_start = line_end + 1
+
+    @cached_property
+    def _region_index(self): #индекс varregion: читается из файла рядом с VCF или строится одним проходом
+        st = os.stat(self.path)
+        stamp = [st.st_mtime_ns, st.st_size]
+        index_path = self.path + _INDEX_SUFFIX
+        try:
+            with open(index_path, 'rb') as f, np.load(f, allow_pickle=False) as saved:
+                if saved['stamp'].tolist() == stamp:
+                    return self._unpack_index(saved)
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile): #индекса нет, он битый или старого формата
+            pass
+        arrays = self._build_index()
+        try:
+            with open(index_path, 'wb') as f:
+                np.savez(f, stamp=np.array(stamp, dtype=np.int64), **arrays)
+        except OSError: #каталог только для чтения - индекс живёт лишь в памяти
+            pass
+        return self._unpack_index(arrays)
+
+    @staticmethod
+    def _unpack_index(arrays): #{хромосома: (позиции по возрастанию, смещения строк)}; None - индекс неприменим
+        if not arrays['usable']:
+            return None
+        bounds, positions, offsets = arrays['bounds'], arrays['positions'], arrays['offsets']
+        return {name: (positions[bounds[i]:bounds[i + 1]], offsets[bounds[i]:bounds[i + 1]])
+                for i, name in enumerate(arrays['names'].tolist())}
+
+    def _build_index(self): #один проход по файлу: позиция и смещение строки каждого варианта
+        parsed = ([], np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+        if os.path.getsize(self.path):
+            with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                begin = sum(map(len, self._raw_headers))
+                parsed = self._parse_index_fast(mm, begin) or self._parse_index_lines(mm, begin)
+        if parsed is None: #POS не число - такие строки обрабатывает полный просмотр
+            return {'usable': np.array(False), 'names': np.array([], dtype=str),
+                    'bounds': np.zeros(1, dtype=np.int64), 'positions': np.array([], dtype=np.int64),
+                    'offsets': np.array([], dtype=np.int64)}
+        names, codes, positions, offsets = parsed
+        #строки каждой хромосомы подряд, внутри - по возрастанию позиции (файл может быть и не отсортирован)
+        order = np.lexsort((positions, codes))
+        return {'usable': np.array(True), 'names': np.array(names, dtype=str),
+                'bounds': np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(names))))).astype(np.int64),
+                'positions': positions[order], 'offsets': offsets[order]}
+
+    @classmethod
+    def _parse_index_lines(cls, mm, begin): #(хромосомы, их коды по строкам, позиции, смещения) - построчно; None - POS не число
+        chroms, codes, positions, offsets = {}, [], [], []
+        for offset, x in cls._data_lines(mm, begin):
+            x = x.strip() #как в varregion: столбцы берутся из строки без пробелов по краям
+            tab = x.find(b'\t')
+            if tab < 0: #меньше двух столбцов - строка пропускается
+                continue
+            try:
+                x_pos = cls._pos_field(x, tab)
+            except ValueError:
+                return None
+            codes.append(chroms.setdefault(x[:tab].decode('latin-1'), len(chroms)))
+            positions.append(x_pos)
+            offsets.append(offset)
+        return (list(chroms), np.array(codes, dtype=np.int64), np.array(positions, dtype=np.int64),
+                np.array(offsets, dtype=np.int64))
+
+    @classmethod
+    def _parse_index_fast(cls, mm, begin): #то же векторно, блоками по границам строк; None - есть строки, которые разбирает
+        #только построчный вариант (пробелы по краям, POS не из одних цифр, слишком длинные CHROM или POS)
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        chroms, codes, positions, offsets = {}, [], [], []
+        block_start = begin
+        while block_start < len(mm): #временные массивы - на один блок, а не на весь файл
+            block_end = len(mm)
+            if block_start + _INDEX_BLOCK < len(mm):
+                block_end = mm.find(b'\n', block_start + _INDEX_BLOCK - 1) + 1 or len(mm)
+            parsed = cls._parse_index_block(mm, buf, block_start, block_end)
+            if parsed is None:
+                return None
+            names, block_codes, block_positions, block_offsets = parsed
+            #коды хромосом блока -> общие коды файла
+            remap = np.array([chroms.setdefault(name, len(chroms)) for name in names], dtype=np.int64)
+            codes.append(remap[block_codes] if len(names) else block_codes)
+            positions.append(block_positions)
+            offsets.append(block_offsets)
+            block_start = block_end
+        if not codes: #после заголовка ничего нет
+            return [], np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        return list(chroms), np.concatenate(codes), np.concatenate(positions), np.concatenate(offsets)
+
+    @staticmethod
+    def _parse_index_block(mm, buf, block_start, block_end): #строки блока [block_start, block_end) файла, смещения - от начала файла
+        newlines = np.flatnonzero(buf[block_start:block_end] == 10) + block_start
+        starts = np.concatenate(([block_start], newlines + 1))
+        ends = np.concatenate((newlines, [block_end]))
+        ends -= (ends > starts) & (buf[ends - 1] == 13) #\r перед переносом
+        first = buf[np.minimum(starts, len(buf) - 1)]
+        data = (ends > starts) & (first != 35) #пустые строки и строки на # пропускаются
+        starts, ends, first = starts[data], ends[data], first[data]
+        if np.isin(first, (9, 10, 11, 12, 13, 32)).any():
+            return None
+        #первая и вторая табуляции строки: CHROM - до первой, POS - между ними (или до конца строки)
+        if len(starts) and block_end - block_start > _LONG_LINE * len(starts):
+            #длинные строки (VCF с образцами: тысячи табуляций) - две табуляции ищутся через mm.find у начала строки,
+            #а не среди всех табуляций блока
+            tab1 = np.array([mm.find(b'\t', s, e) for s, e in zip(starts.tolist(), ends.tolist())], dtype=np.int64)
+            tab1[tab1 < 0] = ends[tab1 < 0]
+            tab2 = np.array([mm.find(b'\t', t + 1, e) if t < e else e
+                             for t, e in zip(tab1.tolist(), ends.tolist())], dtype=np.int64)
+            tab2[tab2 < 0] = ends[tab2 < 0]
+        else:
+            tabs = np.flatnonzero(buf[block_start:block_end] == 9) + block_start
+            i = np.searchsorted(tabs, starts)
+            tabs = np.append(tabs, [block_end, block_end])
+            tab1 = np.minimum(tabs[i], ends)
+            tab2 = np.minimum(tabs[i + 1], ends)
+        with_tab = tab1 < ends #строка из одного столбца пропускается
+        starts, tab1, tab2 = starts[with_tab], tab1[with_tab], tab2[with_tab]
+        chrom_len, pos_len = tab1 - starts, tab2 - tab1 - 1
+        if len(starts) and (pos_len.min() < 1 or pos_len.max() > 18 or chrom_len.max() > 255):
+            return None
+        #POS: цифры всех строк одним массивом, каждая умножается на свою степень 10, суммы - по строкам
+        within = np.arange(pos_len.sum()) - np.repeat(np.cumsum(pos_len) - pos_len, pos_len)
+        digits = buf[np.repeat(tab1 + 1, pos_len) + within].astype(np.int64) - 48
+        if ((digits < 0) | (digits > 9)).any():
+            return None
+        positions = np.add.reduceat(digits * 10 ** (np.repeat(pos_len, pos_len) - 1 - within),
+                                    np.cumsum(pos_len) - pos_len) if len(starts) else np.array([], dtype=np.int64)
+        #CHROM: строки байтов одной ширины, коды - через np.unique
+        width = int(chrom_len.max()) if len(starts) else 1
+        within = np.arange(chrom_len.sum()) - np.repeat(np.cumsum(chrom_len) - chrom_len, chrom_len)
+        table = np.zeros((len(starts), width), dtype=np.uint8)
+        table[np.repeat(np.arange(len(starts)), chrom_len), within] = buf[np.repeat(starts, chrom_len) + within]
+        names, codes = np.unique(table.view(f'S{width}').ravel(), return_inverse=True)
+        return ([name.decode('latin-1') for name in names.tolist()], codes.astype(np.int64).ravel(),
+                positions.astype(np.int64), starts.astype(np.int64))
@@ -14,6 +14,8 @@ def detect_file_type(filepath):
             return 'fastq'
         elif base in ['.fasta', '.fa']:
             return 'fasta'
+        elif base == '.vcf':
+            return 'vcf'
     if ext in ['.fq', '.fastq']:
         return 'fastq'
     elif ext in ['.fa', '.fasta', '.fna']:
@@ -42,6 +44,7 @@ def analyze_fastq(filepath):
         os.makedirs(graphs_dir)
     analyzer = FastqAnalyzer(filepath, graphs_dir)
     print("\nВычисление статистики:")
+    analyzer.analyze()
     seq_count = analyzer.get_sequence_count()
     avg_len = analyzer.get_average_sequence_length()
     print(f"Количество последовательностей: {seq_count}")
@@ -52,6 +55,7 @@ def analyze_fastq(filepath):
     analyzer.plot_per_base_quality_plotly()
     analyzer.plot_per_base_content()
     analyzer.plot_sequence_length_distribution()
+    analyzer.close()
     print(f"Графики сохранены в '{graphs_dir}'")
 
 
@@ -81,11 +85,12 @@ def analyze_vcf(filepath):
     for line in vcf.contig():
         print(line)
 
-    # Количество вариантов
-    print(f"\nКоличество вариантов: {vcf.count()}")
+    # Количество вариантов и статистика по регионам - за один разбор файла
+    summary = vcf.analyze(region_size=1000)
+    print(f"\nКоличество вариантов: {summary['count']}")
 
     # Статистика по регионам
-    stats = vcf.stats(region_size=1000)
+    stats = summary['stats']
     print("\nСтатистика по регионам (первые 10):")
     print(stats.head(10).to_string(index=False))
 
@@ -106,11 +111,14 @@ def analyze_sam(filepath):
     from code.sam_reader import SAMfile
 
     print("\nАнализ SAM")
-    sam = SAMfile()
+    sam = SAMfile(filepath)
+
+    # Файл разбирается один раз: число выравниваний, статистика и поиск в регионе берутся из одной таблицы,
+    # заголовки читаются отдельно - это только строки в начале файла
+    df = sam.alignments_df
 
     # Заголовки по группам
-    headers, alignments = sam.parse_sam_file(filepath)
-    groups = sam.get_header_groups(headers)
+    groups = sam.get_header_groups(sam.read_headers(filepath))
     print("\nЗаголовки по группам:")
     for group, lines in groups.items():
         print(f"{group} ({len(lines)}):")
@@ -118,11 +126,11 @@ def analyze_sam(filepath):
             print(f"  {line}")
 
     # Общее количество выравниваний
-    total = sam.count_alignments(alignments)
+    total = sam.count_alignments(df)
     print(f"\nОбщее количество выравниваний: {total}")
 
     # Расширенная статистика по хромосомам с мин/макс позициями
-    stats = sam.get_chromosome_stats(alignments)
+    stats = sam.get_chromosome_stats(df)
     print("\nСтатистика по хромосомам:")
     print(stats.to_string(index=False))
 
@@ -131,7 +139,7 @@ def analyze_sam(filepath):
     chrom = input("Хромосома (значение из столбца Хромосома): ").strip()
     start = int(input("Начальная позиция (в пределах значений столбцов Мин_позиция и Макс_позиция): ").strip())
     end   = int(input("Конечная позиция (в пределах значений столбцов Мин_позиция и Макс_позиция): ").strip())
-    results = sam.find_alignments_in_region(alignments, chrom, start, end)
+    results = sam.find_alignments_in_region(df, chrom, start, end)
     if not results.empty:
         print(f"\nНайдено {len(results)} выравниваний в {chrom}:{start}-{end}")
         print(results.to_string(index=False))